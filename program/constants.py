@@ -10,6 +10,10 @@ ABORT_ALL_POSITIONS = False
 # Find Cointegrated Pairs
 FIND_COINTEGRATED = True
 
+# Daemon Mode - run continuously with warm state, refreshing cointegrated pairs in the background every COINT_REFRESH_SECONDS
+DAEMON_MODE = False
+COINT_REFRESH_SECONDS = 86400
+
 # Manage Exits
 MANAGE_EXITS = True
 
@@ -28,14 +32,146 @@ ZSCORE_THRESH = 1.49
 USD_PER_TRADE = 40
 USD_MIN_COLLATERAL = 450
 
+# Cointegration Engine - "statsmodels" (coint with autolag) or "numpy" (built-in Engle-Granger with COINT_ADF_LAGS fixed lags)
+COINT_ENGINE = "statsmodels"
+COINT_ADF_LAGS = 1
+
+# Cointegration Pre-screen - vectorized filter before the full test (t-stat threshold kept looser than the 5% critical value)
+# At 400 candles -2.0 keeps about a quarter of unrelated (random walk) pairs, a 3-4x cut - the half life bound does most of the work
+# on longer histories (about 1% kept at 1000 candles). Tighter cutoffs drop pairs the full test accepts (-2.5 and below)
+COINT_PRESCREEN = True
+COINT_PRESCREEN_TSTAT = -2.0
+
+# Cointegration Workers - processes for the statsmodels pair search (None uses all cores, 1 runs serially; the numpy engine always runs serially)
+COINT_WORKERS = None
+
+# Concurrent Legs - send both legs of a pair together and unwind if only one fills
+CONCURRENT_LEGS = True
+
+# Order Tracking - seconds to find a placed order, wait for an entry fill and wait for an unwind fill, and poll backoff bounds
+ORDER_RESOLVE_TIMEOUT = 10
+ORDER_FILL_TIMEOUT = 17
+ORDER_CLOSE_TIMEOUT = 2
+ORDER_POLL_INITIAL_SECONDS = 0.05
+ORDER_POLL_MAX_SECONDS = 1
+
+# Account Snapshot - seconds before the subaccount snapshot is downloaded again (also refreshed at the start of each cycle)
+ACCOUNT_SNAPSHOT_TTL = 30
+
+# Account Fills - latest fills per market searched for the fill price of one of our orders
+ACCOUNT_FILLS_LIMIT = 50
+
+# Block Height - seconds between background refreshes, seconds before falling back to a live query, and initial seconds per block
+BLOCK_POLL_SECONDS = 5
+BLOCK_STALE_SECONDS = 20
+BLOCK_TIME_SECONDS = 1
+
 # Thresholds - Closing
 CLOSE_AT_ZSCORE_CROSS = True
 
+# Historical Candles - number of candles used for cointegration and where they are stored locally
+HISTORY_CANDLES = 400
+CANDLE_STORE_PATH = "candles.db"
+
+# Candle Store Retention - candles kept per market (at least HISTORY_CANDLES); older ones are pruned, so this bounds the store and the backtest history
+CANDLE_STORE_CANDLES = 5000
+
+# Position Store - where open pairs are kept (bot_agents.json is migrated into it on first run)
+POSITION_STORE_PATH = "positions.db"
+
+# Candle Fetching - max requests in flight, per request timeout (seconds) and retries
+CANDLE_FETCH_CONCURRENCY = 16
+CANDLE_REQUEST_TIMEOUT = 10
+CANDLE_REQUEST_RETRIES = 3
+
+# Recent Candles Cache - seconds between refreshes of the still-open candle (None holds it until the next candle)
+CANDLE_OPEN_REFRESH_SECONDS = 60
+
+# Streaming Market Data - candles served from WebSocket ring buffers (falls back to REST while not connected)
+# A feed with no messages for STREAM_STALE_SECONDS is treated as dropped - REST serves candles while it reconnects
+STREAM_MARKET_DATA = True
+STREAM_BUFFER_SIZE = 100
+STREAM_RECONNECT_MAX_SECONDS = 30
+STREAM_STALE_SECONDS = 60
+
+# Scheduler - seconds between wake-ups without a candle close, and seconds each job has to start (and should finish) in
+SCHEDULER_INTERVAL_SECONDS = 60
+EXITS_DEADLINE_SECONDS = 120
+ENTRIES_DEADLINE_SECONDS = 300
+
+# Market Metadata Cache - seconds before market metadata and oracle prices are refreshed
+MARKET_CACHE_TTL = 3600
+ORACLE_PRICE_TTL = 10
+
+# Rate Limits - (requests per second, burst capacity) per endpoint group
+RATE_LIMITS = {
+  "candles": (10, 20),
+  "markets": (5, 10),
+  "subaccount": (5, 10),
+  "orders": (5, 10),
+  "block_height": (5, 5),
+  "transactions": (5, 5),
+}
+RATE_LIMIT_RETRIES = 5
+RATE_LIMIT_BACKOFF = 1
+
+# Notifications - max queued messages, seconds to gather a burst into one message, request timeout and seconds to flush on exit
+NOTIFY_QUEUE_SIZE = 100
+NOTIFY_COALESCE_SECONDS = 2
+NOTIFY_TIMEOUT_SECONDS = 10
+NOTIFY_FLUSH_SECONDS = 15
+
+# Backtesting - cointegration engine, taker fee and slippage (fractions of notional), starting capital and initial margin fraction
+BACKTEST_COINT_ENGINE = "numpy"
+BACKTEST_FEE_RATE = 0.0005
+BACKTEST_SLIPPAGE = 0.0005
+BACKTEST_CAPITAL = 1000
+BACKTEST_MARGIN_FRACTION = 0.05
+
+# Parameter Sweep - processes (None uses all cores) and results file (Parquet if pyarrow is installed, otherwise CSV)
+SWEEP_WORKERS = None
+SWEEP_OUTPUT_PATH = "sweep_results.parquet"
+
+# Simulated Exchange - serve markets, candles, account, orders and blocks locally instead of dYdX (offline runs and load tests)
+SIMULATE_EXCHANGE = False
+
+# Simulation - synthetic markets, median latency (seconds, lognormal spread), chance of a 429 and of a partial fill per request or order
+# Seconds before orders show on the indexer and before marketable orders fill, seconds per block, starting collateral and seed
+SIM_MARKETS = 40
+SIM_LATENCY_SECONDS = 0.05
+SIM_LATENCY_SIGMA = 0.5
+SIM_RATE_LIMIT_PROBABILITY = 0.02
+SIM_PARTIAL_FILL_PROBABILITY = 0.05
+SIM_INDEXER_LAG_SECONDS = 0.3
+SIM_FILL_SECONDS = 0.5
+SIM_BLOCK_SECONDS = 1
+SIM_COLLATERAL = 10000
+SIM_SEED = 7
+
+# Benchmarks - market counts and history lengths benchmarked, pairs sampled for per pair stages, timing runs (best is kept)
+# Slowdown (or memory growth) over the baseline reported as a regression, ignoring differences under BENCHMARK_MIN_SECONDS
+# Defaults match the committed baseline - 10000 candles at 300 markets needs over 5 GB for the numpy pair search and
+# hours for statsmodels, so larger sizes (or the statsmodels pair search) need --candles / --engine and their own baseline
+BENCHMARK_MARKETS = [10, 30, 100, 300]
+BENCHMARK_CANDLES = [400, 1000, 3000]
+BENCHMARK_COINT_ENGINE = "numpy"
+BENCHMARK_PAIR_SAMPLE = 100
+BENCHMARK_REPEAT = 3
+BENCHMARK_TOLERANCE = 0.25
+BENCHMARK_MIN_SECONDS = 0.1
+BENCHMARK_BASELINE_PATH = "benchmark_baseline.json"
+BENCHMARK_RESULTS_PATH = "benchmark_results.json"
+
 # Endpoint for Account Queries on Testnet
 INDEXER_ENDPOINT_TESTNET = "https://indexer.v4testnet.dydx.exchange"
 INDEXER_ENDPOINT_MAINNET = "https://indexer.dydx.trade"
 INDEXER_ACCOUNT_ENDPOINT = INDEXER_ENDPOINT_TESTNET
 
+# Endpoint for Streaming Market Data (matches MARKET_DATA_MODE)
+INDEXER_WS_ENDPOINT_TESTNET = "wss://indexer.v4testnet.dydx.exchange/v4/ws"
+INDEXER_WS_ENDPOINT_MAINNET = "wss://indexer.dydx.trade/v4/ws"
+INDEXER_WS_ENDPOINT = INDEXER_WS_ENDPOINT_MAINNET if MARKET_DATA_MODE != "TESTNET" else INDEXER_WS_ENDPOINT_TESTNET
+
 # Environment Variables
 DYDX_ADDRESS = config("DYDX_ADDRESS")
 SECRET_PHRASE = config("SECRET_PHRASE")
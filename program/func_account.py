@@ -0,0 +1,123 @@
+from constants import DYDX_ADDRESS, ACCOUNT_SNAPSHOT_TTL, ACCOUNT_FILLS_LIMIT
+import asyncio
+import time
+
+
+# Class: Subaccount snapshot
+class AccountSnapshot:
+
+  """
+    Holds one subaccount download with open positions indexed by market and free collateral
+    Refreshed once per cycle (or when older than ACCOUNT_SNAPSHOT_TTL) so pre-trade checks are in-memory lookups
+    Our own fills are applied locally so later checks in the same cycle see them before the indexer does
+    Applied fills are remembered by order id until a refreshed snapshot has processed the block they filled in
+  """
+
+  def __init__(self, client, ttl=ACCOUNT_SNAPSHOT_TTL):
+    self.client = client
+    self.ttl = ttl
+    self.positions = {}
+    self.free_collateral = 0.0
+    self.equity = 0.0
+    self.updated = None
+    self.height = None
+    self.recorded_orders = {}
+    self.lock = asyncio.Lock()
+
+  # Download subaccount and rebuild the snapshot
+  async def refresh(self):
+    async with self.lock:
+      response = await self.client.limiter.call("subaccount", self.client.indexer_account.account.get_subaccount, DYDX_ADDRESS, 0)
+      subaccount = response["subaccount"]
+      self.positions = dict(subaccount["openPerpetualPositions"])
+      self.free_collateral = float(subaccount["freeCollateral"])
+      self.equity = float(subaccount["equity"])
+      self.updated = time.monotonic()
+
+      # Forget fills the snapshot now includes (fills of unknown height are kept)
+      height = subaccount.get("latestProcessedBlockHeight")
+      self.height = int(height) if height is not None else None
+      if self.height is not None:
+        self.recorded_orders = {order_id: fill_height for (order_id, fill_height) in self.recorded_orders.items() if fill_height is None or fill_height > self.height}
+      return subaccount
+
+  # Refresh only if never fetched or too old
+  async def ensure(self):
+    if self.updated is None or time.monotonic() - self.updated >= self.ttl:
+      await self.refresh()
+
+  # Force a refresh on next use
+  def invalidate(self):
+    self.updated = None
+
+  # Check if market has an open position
+  def is_open(self, market):
+    return market in self.positions
+
+  # Get average fill price and latest fill height of an order from the indexer fills (None if not indexed yet)
+  async def get_fill(self, order):
+    response = await self.client.limiter.call(
+      "orders",
+      self.client.indexer_account.account.get_subaccount_fills,
+      DYDX_ADDRESS,
+      0,
+      order["ticker"],
+      limit = ACCOUNT_FILLS_LIMIT,
+    )
+    fills = [fill for fill in response["fills"] if fill["orderId"] == order["id"]]
+    size = sum(float(fill["size"]) for fill in fills)
+    if size <= 0:
+      return (None, None)
+    price = sum(float(fill["size"]) * float(fill["price"]) for fill in fills) / size
+    return (price, max(int(fill["createdAtHeight"]) for fill in fills))
+
+  # Apply one of our fills to the positions and free collateral
+  async def record_fill(self, order):
+
+    # Guard: Only record each order once
+    filled = float(order.get("totalFilled") or 0)
+    if filled <= 0 or order["id"] in self.recorded_orders:
+      return
+    self.recorded_orders[order["id"]] = None
+
+    # Fill price (the order price is only a limit - far from the market for failsafe unwinds), else the oracle price
+    market = order["ticker"]
+    market_info = await self.client.market_cache.get_market(market)
+    (price, fill_height) = await self.get_fill(order)
+    self.recorded_orders[order["id"]] = fill_height
+
+    # Guard: Fill already in the snapshot
+    if fill_height is not None and self.height is not None and fill_height <= self.height:
+      return
+    if price is None:
+      price = float(market_info["oraclePrice"])
+
+    # Signed size change (positive for long)
+    change = filled if order["side"] == "BUY" else -filled
+    position = self.positions.get(market)
+    size = float(position["size"]) if position is not None else 0.0
+    new_size = size + change
+
+    # Margin used moves with the absolute size of the position
+    initial_margin_fraction = float(market_info.get("initialMarginFraction") or 1)
+    self.free_collateral -= (abs(new_size) - abs(size)) * price * initial_margin_fraction
+
+    # Update position
+    if abs(new_size) < 1e-12:
+      self.positions.pop(market, None)
+    elif position is None or size * new_size < 0:
+      self.positions[market] = {
+        "market": market,
+        "status": "OPEN",
+        "side": "LONG" if new_size > 0 else "SHORT",
+        "size": str(new_size),
+        "entryPrice": str(price),
+        "sumOpen": str(abs(new_size)),
+      }
+    else:
+      position = dict(position)
+      position["size"] = str(new_size)
+      if abs(new_size) > abs(size):
+        position["entryPrice"] = str((abs(size) * float(position["entryPrice"]) + abs(change) * price) / abs(new_size))
+        position["sumOpen"] = str(float(position.get("sumOpen") or 0) + abs(change))
+      self.positions[market] = position
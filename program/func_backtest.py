@@ -0,0 +1,263 @@
+from constants import RESOLUTION, WINDOW, ZSCORE_THRESH, MAX_HALF_LIFE, USD_PER_TRADE, USD_MIN_COLLATERAL, HISTORY_CANDLES
+from constants import CLOSE_AT_ZSCORE_CROSS, COINT_REFRESH_SECONDS
+from constants import BACKTEST_COINT_ENGINE, BACKTEST_FEE_RATE, BACKTEST_SLIPPAGE, BACKTEST_CAPITAL, BACKTEST_MARGIN_FRACTION
+from func_cointegration import find_cointegrated_pairs, calculate_zscore_rolling, calculate_zscore_last
+from func_candle_store import CandleStore
+from func_public import build_price_matrix
+from func_utils import RESOLUTION_SECONDS, epoch_to_iso
+import pandas as pd
+import numpy as np
+import time
+
+
+# Load stored candles as a price matrix (candles x markets)
+def load_price_matrix(store=None, resolution=RESOLUTION, markets=None, since=0):
+  store = store if store is not None else CandleStore()
+  markets = markets if markets is not None else store.markets(resolution)
+  market_candles = {}
+  for market in markets:
+    (started_at, closes) = store.load_arrays(market, resolution, since)
+    if len(started_at) > 0:
+      market_candles[market] = (started_at, closes)
+  return build_price_matrix(market_candles)
+
+
+# Carry the last price forward over missing candles (for marking open positions)
+def forward_fill(prices):
+  valid = ~np.isnan(prices)
+  rows = np.where(valid, np.arange(prices.shape[0])[:, np.newaxis], 0)
+  np.maximum.accumulate(rows, axis=0, out=rows)
+  return prices[rows, np.arange(prices.shape[1])]
+
+
+# Select cointegrated pairs for each trading period from the lookback candles before it
+# Mirrors the live bot, which finds pairs from HISTORY_CANDLES candles and refreshes them every COINT_REFRESH_SECONDS
+# Returns a list of (start, stop, base_index, quote_index, hedge_ratio, half_life) with pairs as arrays
+def select_pairs_by_period(prices, lookback=HISTORY_CANDLES, refit_every=None, max_half_life=MAX_HALF_LIFE, engine=BACKTEST_COINT_ENGINE):
+  if refit_every is None:
+    refit_every = max(COINT_REFRESH_SECONDS // RESOLUTION_SECONDS[RESOLUTION], 1)
+  periods = []
+  for start in range(lookback, prices.shape[0], refit_every):
+    stop = min(start + refit_every, prices.shape[0])
+
+    # Markets with a full lookback (the live bot drops markets with missing candles)
+    history = prices[start - lookback:start]
+    complete = np.flatnonzero(~np.isnan(history).any(axis=0))
+    pairs = find_cointegrated_pairs(history[:, complete], list(complete), max_half_life, workers=1, engine=engine, verbose=False)
+
+    periods.append((
+      start,
+      stop,
+      np.array([pair["base_market"] for pair in pairs], dtype=np.intp),
+      np.array([pair["quote_market"] for pair in pairs], dtype=np.intp),
+      np.array([pair["hedge_ratio"] for pair in pairs], dtype=np.float64),
+      np.array([pair["half_life"] for pair in pairs], dtype=np.float64),
+    ))
+  return periods
+
+
+# Class: Simulated fills and fees
+class FillModel:
+
+  """
+    Fills at the candle close moved against us by slippage, paying a taker fee on notional
+  """
+
+  def __init__(self, fee_rate=BACKTEST_FEE_RATE, slippage=BACKTEST_SLIPPAGE):
+    self.fee_rate = fee_rate
+    self.slippage = slippage
+
+  # Fill price for buying (side 1) or selling (side -1) at a close price (works on arrays)
+  def price(self, close, side):
+    return close * (1 + side * self.slippage)
+
+  # Fee for a fill
+  def fee(self, price, size):
+    return np.abs(price * size) * self.fee_rate
+
+
+# Run the pairs strategy over a price matrix (candles x markets)
+# Entries follow open_positions and exits follow manage_trade_exits, checked once per candle close (exits first)
+def run_backtest(
+  prices,
+  markets,
+  index=None,
+  window=WINDOW,
+  z_thresh=ZSCORE_THRESH,
+  max_half_life=MAX_HALF_LIFE,
+  usd_per_trade=USD_PER_TRADE,
+  lookback=HISTORY_CANDLES,
+  refit_every=None,
+  close_at_zscore_cross=CLOSE_AT_ZSCORE_CROSS,
+  capital=BACKTEST_CAPITAL,
+  min_collateral=USD_MIN_COLLATERAL,
+  margin_fraction=BACKTEST_MARGIN_FRACTION,
+  fill_model=None,
+  periods=None,
+):
+
+  """
+    Pairs, hedge ratios and z-scores come from the same code as the live bot
+    Z-scores of every candidate pair are computed for a whole trading period at once
+    The loop over candles only handles open positions and the (few) triggered pairs
+    Pass periods from select_pairs_by_period to reuse a pair selection across runs
+  """
+
+  # Initialize
+  prices = np.asarray(prices, dtype=np.float64)
+  fill_model = fill_model if fill_model is not None else FillModel()
+  if periods is None:
+    periods = select_pairs_by_period(prices, lookback, refit_every, max_half_life)
+  marks = forward_fill(prices)
+  n_candles = prices.shape[0]
+  equity = np.full(n_candles, float(capital))
+  realized = 0.0
+  fees = 0.0
+  turnover = 0.0
+  trades = []
+
+  # Open positions as parallel lists (base, quote, hedge ratio, z-score traded, trade record, signed sizes, entry prices)
+  open_base, open_quote, open_hedge, open_z, open_trade = [], [], [], [], []
+  open_size_1, open_size_2, open_price_1, open_price_2 = [], [], [], []
+  open_markets = set()
+
+  for (start, stop, base_index, quote_index, hedge_ratio, half_life) in periods:
+
+    # Z-scores of all candidate pairs over the period in one pass
+    if len(base_index) > 0 and start - window + 1 >= 0:
+      history = prices[start - window + 1:stop]
+      spreads = history[:, base_index] - hedge_ratio * history[:, quote_index]
+      z_scores = calculate_zscore_rolling(spreads, window)[window - 1:]
+    else:
+      z_scores = np.full((stop - start, len(base_index)), np.nan)
+
+    for t in range(start, stop):
+
+      # Exits - z-score crossed zero and moved at least as far as when traded
+      if close_at_zscore_cross and len(open_base) > 0 and t - window + 1 >= 0:
+        base_array = np.array(open_base)
+        quote_array = np.array(open_quote)
+        recent = prices[t - window + 1:t + 1]
+        z_current = calculate_zscore_last(recent[:, base_array] - np.array(open_hedge) * recent[:, quote_array], window)
+        z_traded = np.array(open_z)
+        with np.errstate(invalid="ignore"):
+          is_close = (np.abs(z_current) >= np.abs(z_traded)) & (np.sign(z_current) == -np.sign(z_traded))
+          is_close &= ~np.isnan(prices[t, base_array]) & ~np.isnan(prices[t, quote_array])
+
+        # Close positions (fills against the open size)
+        for k in sorted(np.flatnonzero(is_close), reverse=True):
+          exit_1 = fill_model.price(prices[t, open_base[k]], -np.sign(open_size_1[k]))
+          exit_2 = fill_model.price(prices[t, open_quote[k]], -np.sign(open_size_2[k]))
+          fee = fill_model.fee(exit_1, open_size_1[k]) + fill_model.fee(exit_2, open_size_2[k])
+          pnl = open_size_1[k] * (exit_1 - open_price_1[k]) + open_size_2[k] * (exit_2 - open_price_2[k])
+          realized += pnl - fee
+          fees += fee
+          turnover += abs(exit_1 * open_size_1[k]) + abs(exit_2 * open_size_2[k])
+          open_trade[k].update({"exit_t": t, "z_score_exit": float(z_current[k]), "pnl": pnl, "fees": open_trade[k]["fees"] + fee})
+          open_markets.difference_update([open_base[k], open_quote[k]])
+          for values in [open_base, open_quote, open_hedge, open_z, open_trade, open_size_1, open_size_2, open_price_1, open_price_2]:
+            del values[k]
+
+      # Entries - triggered pairs strongest first
+      z_row = z_scores[t - start]
+      with np.errstate(invalid="ignore"):
+        triggered = np.flatnonzero(np.abs(z_row) >= z_thresh)
+      for j in triggered[np.argsort(-np.abs(z_row[triggered]), kind="stable")]:
+        base, quote = int(base_index[j]), int(quote_index[j])
+
+        # Ensure like-for-like not already open (diversify trading)
+        if base in open_markets or quote in open_markets:
+          continue
+
+        # Guard: Ensure collateral
+        unrealized = sum(open_size_1[k] * (marks[t, open_base[k]] - open_price_1[k]) + open_size_2[k] * (marks[t, open_quote[k]] - open_price_2[k]) for k in range(len(open_base)))
+        margin = sum(abs(open_size_1[k]) * marks[t, open_base[k]] + abs(open_size_2[k]) * marks[t, open_quote[k]] for k in range(len(open_base))) * margin_fraction
+        if capital + realized + unrealized - margin < min_collateral:
+          break
+
+        # Open both legs (base bought when z-score is negative)
+        z_score = float(z_row[j])
+        side_1 = 1 if z_score < 0 else -1
+        size_1 = side_1 * usd_per_trade / prices[t, base]
+        size_2 = -side_1 * usd_per_trade / prices[t, quote]
+        entry_1 = fill_model.price(prices[t, base], side_1)
+        entry_2 = fill_model.price(prices[t, quote], -side_1)
+        fee = fill_model.fee(entry_1, size_1) + fill_model.fee(entry_2, size_2)
+        realized -= fee
+        fees += fee
+        turnover += abs(entry_1 * size_1) + abs(entry_2 * size_2)
+
+        # Record trade
+        trade = {
+          "base_market": markets[base],
+          "quote_market": markets[quote],
+          "hedge_ratio": float(hedge_ratio[j]),
+          "half_life": float(half_life[j]),
+          "z_score": z_score,
+          "entry_t": t,
+          "exit_t": None,
+          "z_score_exit": None,
+          "pnl": None,
+          "fees": fee,
+        }
+        trades.append(trade)
+        for (values, value) in zip(
+          [open_base, open_quote, open_hedge, open_z, open_trade, open_size_1, open_size_2, open_price_1, open_price_2],
+          [base, quote, float(hedge_ratio[j]), z_score, trade, size_1, size_2, entry_1, entry_2]
+        ):
+          values.append(value)
+        open_markets.update([base, quote])
+
+      # Mark to market
+      unrealized = 0.0
+      if len(open_base) > 0:
+        unrealized = float(np.sum(
+          np.array(open_size_1) * (marks[t, open_base] - np.array(open_price_1))
+          + np.array(open_size_2) * (marks[t, open_quote] - np.array(open_price_2))
+        ))
+      equity[t] = capital + realized + unrealized
+
+  # Equity before the first trading candle stays at capital, after the last period it carries forward
+  last_t = periods[-1][1] if periods else 0
+  if last_t < n_candles:
+    equity[last_t:] = equity[last_t - 1] if last_t > 0 else capital
+
+  # Build outputs
+  df_trades = pd.DataFrame(trades, columns=["base_market", "quote_market", "hedge_ratio", "half_life", "z_score", "entry_t", "exit_t", "z_score_exit", "pnl", "fees"])
+  equity_index = [epoch_to_iso(started_at) for started_at in index] if index is not None else None
+  equity = pd.Series(equity, index=equity_index, name="equity")
+  stats = backtest_stats(equity.values, df_trades, capital, turnover, fees)
+  return {"equity": equity, "trades": df_trades, "stats": stats}
+
+
+# Summary statistics of a backtest
+def backtest_stats(equity, trades, capital, turnover, fees):
+  periods_per_year = 365 * 86400 / RESOLUTION_SECONDS[RESOLUTION]
+  returns = np.diff(equity) / equity[:-1] if len(equity) > 1 else np.zeros(0)
+  std = returns.std(ddof=1) if len(returns) > 1 else 0
+  sharpe = returns.mean() / std * np.sqrt(periods_per_year) if std > 0 else 0.0
+  drawdown = 1 - equity / np.maximum.accumulate(equity) if len(equity) > 0 else np.zeros(0)
+  closed = trades[trades["exit_t"].notna()]
+  return {
+    "pnl": float(equity[-1] - capital) if len(equity) > 0 else 0.0,
+    "return": float(equity[-1] / capital - 1) if len(equity) > 0 else 0.0,
+    "sharpe": float(sharpe),
+    "max_drawdown": float(drawdown.max()) if len(drawdown) > 0 else 0.0,
+    "turnover": float(turnover / capital),
+    "fees": float(fees),
+    "trades": int(len(trades)),
+    "closed_trades": int(len(closed)),
+    "win_rate": float((closed["pnl"] - closed["fees"] > 0).mean()) if len(closed) > 0 else 0.0,
+  }
+
+
+# Backtest stored candles with the current settings
+if __name__ == "__main__":
+  index, markets, prices = load_price_matrix()
+  print(f"Backtesting {len(markets)} markets over {len(index)} candles...")
+  start_time = time.perf_counter()
+  result = run_backtest(prices, markets, index)
+  print(f"Backtest finished in {time.perf_counter() - start_time:.1f} seconds")
+  print(result["trades"].tail(20))
+  for (key, value) in result["stats"].items():
+    print(f"{key}: {value}")
@@ -0,0 +1,265 @@
+from constants import RESOLUTION, COINT_ADF_LAGS
+from constants import BENCHMARK_MARKETS, BENCHMARK_CANDLES, BENCHMARK_PAIR_SAMPLE, BENCHMARK_REPEAT, BENCHMARK_TOLERANCE, BENCHMARK_MIN_SECONDS
+from constants import BENCHMARK_COINT_ENGINE, BENCHMARK_BASELINE_PATH, BENCHMARK_RESULTS_PATH
+from func_cointegration import calculate_cointegration, store_cointegration_results, half_life_mean_reversion, half_life_mean_reversion_batch
+from func_cointegration import calculate_zscore, calculate_zscore_rolling
+from func_engle_granger import engle_granger, engle_granger_batch
+from func_public import build_price_matrix
+from func_utils import RESOLUTION_SECONDS
+from statsmodels.tsa.stattools import coint
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+import pandas as pd
+import numpy as np
+import tempfile
+import tracemalloc
+import warnings
+import argparse
+import platform
+import json
+import time
+import sys
+import io
+import os
+
+
+# Synthetic price matrix (candles x markets)
+# Even markets load on shared random-walk factors plus AR(1) noise (cointegrated with others on the same factor), odd markets are independent random walks
+def synthetic_prices(n_markets, n_candles, seed=0):
+  rng = np.random.default_rng(seed)
+  n_factors = max(1, n_markets // 4)
+  factors = np.cumsum(rng.normal(0, 1, (n_candles, n_factors)), axis=0) + 100
+  shocks = rng.normal(0, 1, (n_candles, n_markets))
+  phi = rng.uniform(0.3, 0.9, n_markets)
+  noise = np.zeros((n_candles, n_markets))
+  for t in range(1, n_candles):
+    noise[t] = phi * noise[t - 1] + shocks[t]
+  loadings = rng.uniform(0.5, 2, n_markets)
+  prices = np.where(
+    np.arange(n_markets) % 2 == 0,
+    loadings * factors[:, np.arange(n_markets) % n_factors] + noise + 50,
+    np.cumsum(shocks, axis=0) + 200,
+  )
+  markets = [f"BENCH{market_number}-USD" for market_number in range(n_markets)]
+  return np.maximum(prices, 1.0), markets
+
+
+# Per market (started_at, close) arrays from a price matrix, with late listings and missing candles as the indexer returns them
+def synthetic_market_candles(prices, markets, seed=0):
+  rng = np.random.default_rng(seed)
+  resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+  started_at = 1700000000 - 1700000000 % resolution_seconds + np.arange(prices.shape[0], dtype=np.int64) * resolution_seconds
+  market_candles = {}
+  for (i, market) in enumerate(markets):
+    keep = rng.random(prices.shape[0]) > 0.01
+    keep[:int(rng.integers(0, prices.shape[0] // 10 + 1))] = False
+    keep[-1] = True
+    market_candles[market] = (started_at[keep], prices[keep, i])
+  return market_candles
+
+
+# Sample of pairs (base, quote column indices) drawn without replacement
+def sample_pairs(n_markets, n_pairs, seed=0):
+  (base, quote) = np.triu_indices(n_markets, k=1)
+  chosen = np.sort(np.random.default_rng(seed).permutation(len(base))[:n_pairs])
+  return base[chosen], quote[chosen]
+
+
+# Measure a call in two separate passes - peak memory from one run under tracemalloc, then the best time of repeat runs
+# Memory is measured first, before the timed runs warm caches, and tracemalloc overhead stays out of the timings
+# Memory allocated in worker processes is not seen by tracemalloc
+def measure(function, repeat=BENCHMARK_REPEAT):
+  tracemalloc.start()
+  try:
+    function()
+    (_, peak) = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  seconds = []
+  for _ in range(repeat):
+    start_time = time.perf_counter()
+    function()
+    seconds.append(time.perf_counter() - start_time)
+  return {"seconds": min(seconds), "peak_mb": peak / 2 ** 20, "runs": repeat + 1}
+
+
+# Run store_cointegration_results in a scratch directory (it writes cointegrated_pairs.csv) without its output
+def store_cointegration_results_quietly(df_market_prices, engine=BENCHMARK_COINT_ENGINE):
+  cwd = os.getcwd()
+  with tempfile.TemporaryDirectory() as directory:
+    os.chdir(directory)
+    try:
+      with redirect_stdout(io.StringIO()):
+        store_cointegration_results(df_market_prices, engine)
+    finally:
+      os.chdir(cwd)
+
+
+# Benchmark every stage for one (markets, candles) size
+def benchmark_size(n_markets, n_candles, pair_sample=BENCHMARK_PAIR_SAMPLE, repeat=BENCHMARK_REPEAT, engine=BENCHMARK_COINT_ENGINE, seed=0):
+
+  """
+    Per pair stages run over the same sample of pairs, so their times grow with history length only
+    The price matrix and pair search stages cover every market, so they grow with market count too
+    Every stage runs once for memory and then repeat times for timing (see measure), so timings are from warm runs
+    The pair search stage uses a single timed run, so it runs twice in total - at 300 markets a statsmodels pair search takes minutes
+  """
+
+  (prices, markets) = synthetic_prices(n_markets, n_candles, seed)
+  market_candles = synthetic_market_candles(prices, markets, seed)
+  df_market_prices = pd.DataFrame(prices, columns=markets)
+  (base, quote) = sample_pairs(n_markets, pair_sample, seed)
+  hedge_ratios = engle_granger_batch(prices[:, base], prices[:, quote])[3]
+  spreads = prices[:, base] - hedge_ratios * prices[:, quote]
+
+  def coint_loop(engine):
+    with redirect_stdout(io.StringIO()):
+      for (i, j) in zip(base, quote):
+        calculate_cointegration(prices[:, i], prices[:, j], engine=engine)
+
+  def half_life_loop():
+    for k in range(spreads.shape[1]):
+      half_life_mean_reversion(spreads[:, k])
+
+  def zscore_loop():
+    for k in range(spreads.shape[1]):
+      calculate_zscore(spreads[:, k])
+
+  stages = {
+    "construct_market_prices.build_price_matrix": (lambda: build_price_matrix(market_candles), repeat),
+    "calculate_cointegration.numpy": (lambda: coint_loop("numpy"), repeat),
+    "calculate_cointegration.statsmodels": (lambda: coint_loop("statsmodels"), repeat),
+    "half_life_mean_reversion": (half_life_loop, repeat),
+    "half_life_mean_reversion_batch": (lambda: half_life_mean_reversion_batch(spreads), repeat),
+    "calculate_zscore": (zscore_loop, repeat),
+    "calculate_zscore_rolling": (lambda: calculate_zscore_rolling(spreads), repeat),
+    f"store_cointegration_results.{engine}": (lambda: store_cointegration_results_quietly(df_market_prices, engine), 1),
+  }
+
+  results = {}
+  for (stage, (function, stage_repeat)) in stages.items():
+    result = measure(function, stage_repeat)
+    result.update({"markets": n_markets, "candles": n_candles, "pairs": len(base) if "store" not in stage and "build" not in stage else None})
+    results[f"{stage}/{n_markets}x{n_candles}"] = result
+    print(f"{stage:<45} {n_markets:>4} markets {n_candles:>6} candles {result['seconds']:>9.4f} s {result['peak_mb']:>9.1f} MB")
+  return results
+
+
+# Compare the numpy Engle-Granger engine with statsmodels coint at fixed lags
+def check_engine_agreement(n_markets=30, n_candles=400, lags=(0, 1, 3), seed=1):
+
+  """
+    Both engines run the same fixed-lag test, so t-statistics and p-values should agree to rounding and critical values exactly
+    Flags from calculate_cointegration can still differ, as the statsmodels engine picks its lags by AIC
+  """
+
+  (prices, markets) = synthetic_prices(n_markets, n_candles, seed)
+  (base, quote) = np.triu_indices(n_markets, k=1)
+  agreement = {"pairs": len(base)}
+  with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=Warning)
+    for lag in lags:
+      numpy_results = [engle_granger(prices[:, i], prices[:, j], lag) for (i, j) in zip(base, quote)]
+      statsmodels_results = [coint(prices[:, i], prices[:, j], trend="c", maxlag=lag, autolag=None) for (i, j) in zip(base, quote)]
+      batch_t = engle_granger_batch(prices[:, base], prices[:, quote], lag)[0]
+      t_numpy = np.array([result[0] for result in numpy_results])
+      t_statsmodels = np.array([result[0] for result in statsmodels_results])
+      p_numpy = np.array([result[1] for result in numpy_results])
+      p_statsmodels = np.array([result[1] for result in statsmodels_results])
+      agreement[f"lags_{lag}"] = {
+        "max_t_diff": float(np.max(np.abs(t_numpy - t_statsmodels))),
+        "max_p_diff": float(np.max(np.abs(p_numpy - p_statsmodels))),
+        "max_batch_t_diff": float(np.max(np.abs(batch_t - t_numpy))),
+        "critical_values_match": bool(all(np.allclose(result_numpy[2], result_statsmodels[2]) for (result_numpy, result_statsmodels) in zip(numpy_results, statsmodels_results))),
+      }
+    with redirect_stdout(io.StringIO()):
+      flags_numpy = [calculate_cointegration(prices[:, i], prices[:, j], engine="numpy")[0] for (i, j) in zip(base, quote)]
+      flags_statsmodels = [calculate_cointegration(prices[:, i], prices[:, j], engine="statsmodels")[0] for (i, j) in zip(base, quote)]
+  agreement["flag_agreement"] = float(np.mean(np.array(flags_numpy) == np.array(flags_statsmodels)))
+  agreement["adf_lags"] = COINT_ADF_LAGS
+  agreement["passed"] = all(
+    value["max_t_diff"] < 1e-8 and value["max_p_diff"] < 1e-8 and value["max_batch_t_diff"] < 1e-8 and value["critical_values_match"]
+    for (key, value) in agreement.items() if key.startswith("lags_")
+  )
+  return agreement
+
+
+# Run the benchmark grid
+def run_benchmarks(market_counts=BENCHMARK_MARKETS, candle_counts=BENCHMARK_CANDLES, pair_sample=BENCHMARK_PAIR_SAMPLE, repeat=BENCHMARK_REPEAT, engine=BENCHMARK_COINT_ENGINE):
+  results = {}
+  for n_candles in candle_counts:
+    for n_markets in market_counts:
+      results.update(benchmark_size(n_markets, n_candles, min(pair_sample, n_markets * (n_markets - 1) // 2), repeat, engine))
+  return {
+    "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    "python": platform.python_version(),
+    "numpy": np.__version__,
+    "cpu_count": os.cpu_count(),
+    "coint_engine": engine,
+    "results": results,
+  }
+
+
+# Stages slower (or using more memory) than the baseline beyond the tolerance, and stages the baseline does not cover
+# Differences under BENCHMARK_MIN_SECONDS are ignored as timer noise
+def compare_baseline(current, baseline, tolerance=BENCHMARK_TOLERANCE, min_seconds=BENCHMARK_MIN_SECONDS):
+  regressions = []
+  missing = []
+  for (key, result) in current["results"].items():
+    base_result = baseline["results"].get(key)
+    if base_result is None:
+      missing.append(key)
+      continue
+    if result["seconds"] > base_result["seconds"] * (1 + tolerance) and result["seconds"] - base_result["seconds"] > min_seconds:
+      regressions.append(f"{key}: {base_result['seconds']:.4f} s -> {result['seconds']:.4f} s")
+    if result["peak_mb"] > base_result["peak_mb"] * (1 + tolerance) and result["peak_mb"] - base_result["peak_mb"] > 1:
+      regressions.append(f"{key}: {base_result['peak_mb']:.1f} MB -> {result['peak_mb']:.1f} MB")
+  return regressions, missing
+
+
+# Save results as JSON
+def save_results(results, path):
+  with open(f"{path}.tmp", "w") as f:
+    json.dump(results, f, indent=2)
+  os.replace(f"{path}.tmp", path)
+
+
+# Run benchmarks, check engine agreement and compare with the saved baseline
+# Exits with status 1 on a regression or engine disagreement so it can gate a commit
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="Benchmark the statistical and data assembly hot paths")
+  parser.add_argument("--markets", type=int, nargs="+", default=BENCHMARK_MARKETS)
+  parser.add_argument("--candles", type=int, nargs="+", default=BENCHMARK_CANDLES)
+  parser.add_argument("--pairs", type=int, default=BENCHMARK_PAIR_SAMPLE)
+  parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT)
+  parser.add_argument("--engine", choices=["statsmodels", "numpy"], default=BENCHMARK_COINT_ENGINE, help="Cointegration engine for the pair search stage")
+  parser.add_argument("--baseline", default=BENCHMARK_BASELINE_PATH)
+  parser.add_argument("--output", default=BENCHMARK_RESULTS_PATH)
+  parser.add_argument("--save-baseline", action="store_true", help="Save these results as the new baseline")
+  args = parser.parse_args()
+
+  results = run_benchmarks(args.markets, args.candles, args.pairs, args.repeat, args.engine)
+  print("Checking numpy engine against statsmodels...")
+  results["engine_agreement"] = check_engine_agreement()
+  print(json.dumps(results["engine_agreement"], indent=2))
+  save_results(results, args.output)
+  print(f"Benchmark results saved to {args.output}")
+
+  failed = not results["engine_agreement"]["passed"]
+  if args.save_baseline:
+    save_results(results, args.baseline)
+    print(f"Baseline saved to {args.baseline}")
+  elif os.path.exists(args.baseline):
+    with open(args.baseline) as f:
+      (regressions, missing) = compare_baseline(results, json.load(f))
+    for regression in regressions:
+      print(f"REGRESSION {regression}")
+    for key in missing:
+      print(f"NOT IN BASELINE {key}")
+    print(f"{len(regressions)} regressions and {len(missing)} stages not covered by {args.baseline}")
+    if len(missing) > 0:
+      print("Stages not in the baseline are unchecked - run the baseline grid and engine, or --save-baseline to cover them")
+    failed = failed or len(regressions) > 0 or len(missing) > 0
+  else:
+    print(f"No baseline at {args.baseline} - run with --save-baseline to create one")
+  sys.exit(1 if failed else 0)
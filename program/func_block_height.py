@@ -0,0 +1,78 @@
+from constants import BLOCK_POLL_SECONDS, BLOCK_STALE_SECONDS, BLOCK_TIME_SECONDS
+import asyncio
+import time
+
+
+# Class: Block height tracker
+class BlockHeightTracker:
+
+  """
+    Keeps the latest block height and when it was seen, refreshed by a background task
+    Heights between refreshes are extrapolated from the measured block time so orders need no node round trip
+    Falls back to a live query when the last refresh is older than BLOCK_STALE_SECONDS
+  """
+
+  def __init__(self, client, poll_seconds=BLOCK_POLL_SECONDS, stale_seconds=BLOCK_STALE_SECONDS):
+    self.client = client
+    self.poll_seconds = poll_seconds
+    self.stale_seconds = stale_seconds
+    self.height = None
+    self.updated_at = 0
+    self.block_time = BLOCK_TIME_SECONDS
+    self.task = None
+
+  # Start refreshing in the background
+  def start(self):
+    if self.task is None:
+      self.task = asyncio.create_task(self.run())
+
+  # Stop refreshing
+  async def stop(self):
+    if self.task is not None:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
+
+  # Check if the last refresh is too old to extrapolate from
+  def is_stale(self):
+    return self.height is None or time.monotonic() - self.updated_at > self.stale_seconds
+
+  # Query node for latest block height
+  async def refresh(self):
+    height = await self.client.limiter.call("block_height", self.client.node.latest_block_height)
+    now = time.monotonic()
+
+    # Measure block time from blocks produced since last refresh (smoothed)
+    if self.height is not None and height > self.height:
+      block_time = (now - self.updated_at) / (height - self.height)
+      self.block_time = 0.8 * self.block_time + 0.2 * block_time
+
+    # Guard: Never move backwards (a lagging node may answer with an older height)
+    if self.height is None or height >= self.height:
+      self.height = height
+      self.updated_at = now
+    return self.height
+
+  # Keep height fresh
+  async def run(self):
+    while True:
+      try:
+        await self.refresh()
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        print(f"Unable to refresh block height - {e}")
+      await asyncio.sleep(self.poll_seconds)
+
+  # Get current block height without I/O unless stale
+  async def current_height(self):
+    if self.is_stale():
+      return await self.refresh()
+    return self.height + int((time.monotonic() - self.updated_at) / self.block_time)
+
+  # Get good til block for a short term order
+  async def good_til_block(self, blocks_ahead):
+    return await self.current_height() + blocks_ahead
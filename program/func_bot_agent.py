@@ -1,11 +1,18 @@
-from func_private import place_market_order, check_order_status, cancel_order
+from func_private import place_market_order, cancel_order
 from datetime import datetime
 from func_messaging import send_message
+from constants import CONCURRENT_LEGS, ORDER_CLOSE_TIMEOUT
+import asyncio
 import time
 
 from pprint import pprint
 
 
+# Error: Leg order sent but its id never resolved, so whether it filled is unknown
+class UnresolvedOrderError(Exception):
+  pass
+
+
 # Class: Agent for managing opening and checking trades
 class BotAgent:
 
@@ -29,6 +36,7 @@ class BotAgent:
     z_score,
     half_life,
     hedge_ratio,
+    accept_failsafe_quote_price=None,
   ):
 
     # Initialize class variables
@@ -42,6 +50,7 @@ class BotAgent:
     self.quote_size = quote_size
     self.quote_price = quote_price
     self.accept_failsafe_base_price = accept_failsafe_base_price
+    self.accept_failsafe_quote_price = accept_failsafe_quote_price
     self.z_score = z_score
     self.half_life = half_life
     self.hedge_ratio = hedge_ratio
@@ -64,16 +73,14 @@ class BotAgent:
       "order_time_m2": "",
       "pair_status": "",
       "comments": "",
+      "leg_skew_ms": None,
     }
 
   # Check order status by id
   async def check_order_status_by_id(self, order_id):
 
-    # Allow time to process
-    time.sleep(2)
-
-    # Check order status
-    order_status =  await check_order_status(self.client, order_id)
+    # Wait until order is filled or cancelled (or order expiration)
+    order_status = await self.client.order_tracker.wait_for_status(order_id, ["FILLED", "CANCELED"])
 
     # Guard: If order cancelled move onto next Pair
     if order_status == "CANCELED":
@@ -81,30 +88,29 @@ class BotAgent:
       self.order_dict["pair_status"] = "FAILED"
       return "failed"
 
-    # Guard: If order not filled wait until order expiration
-    if order_status != "FAILED":
-      time.sleep(15)
-      order_status = await check_order_status(self.client, order_id)
-
-      # Guard: If order cancelled move onto next Pair
-      if order_status == "CANCELED":
-        print(f"{self.market_1} vs {self.market_2} - Order cancelled...")
-        self.order_dict["pair_status"] = "FAILED"
-        return "failed"
-
-      # Guard: If not filled, cancel order
-      if order_status != "FILLED":
-        await cancel_order(self.client, order_id)
-        self.order_dict["pair_status"] = "ERROR"
-        print(f"{self.market_1} vs {self.market_2} - Order error. Cancellation request sent, please check open orders..")
-        return "error"
+    # Guard: If not filled, cancel order (and wait for it to settle so any partial fill is known)
+    if order_status != "FILLED":
+      await cancel_order(self.client, order_id)
+      await self.client.order_tracker.wait_for_status(order_id, ["FILLED", "CANCELED"], ORDER_CLOSE_TIMEOUT)
+      self.order_dict["pair_status"] = "ERROR"
+      print(f"{self.market_1} vs {self.market_2} - Order error. Cancellation request sent, please check open orders..")
+      return "error"
 
     # Return live
     return "live"
 
+  # Get size filled on an order that did not go live (cancelled orders can be partly filled)
+  async def filled_size(self, order_id):
+    order = await self.client.order_tracker.get_order(order_id)
+    return float(order.get("totalFilled") or 0)
+
   # Open trades
   async def open_trades(self):
 
+    # Send both legs together if enabled
+    if CONCURRENT_LEGS and self.accept_failsafe_quote_price is not None:
+      return await self.open_trades_concurrent()
+
     # Print status
     print("---")
     print(f"{self.market_1}: Placing first order...")
@@ -142,10 +148,13 @@ class BotAgent:
     order_status_m1 = await self.check_order_status_by_id(self.order_dict["order_id_m1"])
     print(order_status_m1)
 
-    # Guard: Aborder if order failed
+    # Guard: Aborder if order failed (closing any partial fill)
     if order_status_m1 != "live":
       self.order_dict["pair_status"] = "ERROR"
       self.order_dict["comments"] = f"{self.market_1} failed to fill"
+      filled_m1 = await self.filled_size(self.order_dict["order_id_m1"])
+      if filled_m1 > 0:
+        await self.unwind_leg(self.market_1, self.base_side, filled_m1, self.accept_failsafe_base_price)
       return self.order_dict
 
     # Print status - opening second order
@@ -186,6 +195,11 @@ class BotAgent:
       self.order_dict["pair_status"] = "ERROR"
       self.order_dict["comments"] = f"{self.market_1} failed to fill"
 
+      # Close any partial fill of order 2 (the failsafe price is the worst accepted price for the base leg only, so use the quote price)
+      filled_m2 = await self.filled_size(self.order_dict["order_id_m2"])
+      if filled_m2 > 0:
+        await self.unwind_leg(self.market_2, self.quote_side, filled_m2, self.accept_failsafe_quote_price or self.quote_price)
+
       # Close order 1:
       try:
         (close_order, order_id) =  await place_market_order(
@@ -198,8 +212,7 @@ class BotAgent:
         )
 
         # Ensure order is live before proceeding
-        time.sleep(2)
-        order_status_close_order = await check_order_status(self.client, order_id)
+        order_status_close_order = await self.client.order_tracker.wait_for_status(order_id, ["FILLED", "CANCELED"], ORDER_CLOSE_TIMEOUT)
         if order_status_close_order != "FILLED":
           print("ABORT PROGRAM")
           print("Unexpected Error")
@@ -231,4 +244,145 @@ class BotAgent:
       print("")
       send_message(f"{self.market_1}:{self.base_side} and {self.market_2}:{self.quote_side}, zscore: {self.z_score}, half-life: {self.half_life}")
       self.order_dict["pair_status"] = "LIVE"
-      return self.order_dict
\ No newline at end of file
+      return self.order_dict
+
+  # Place order for one leg, returning order id and time the order was sent (monotonic seconds, before the id is resolved)
+  # place_market_order exits when the order id cannot be resolved - raised as an error here so it stays inside the gather
+  # of both legs and the other leg can be unwound before aborting
+  async def place_leg(self, market, side, size, price):
+    sent = {}
+    try:
+      (order, order_id) = await place_market_order(
+        self.client,
+        market=market,
+        side=side,
+        size=size,
+        price=price,
+        reduce_only=False,
+        on_sent=lambda: sent.setdefault("at", time.monotonic())
+      )
+    except SystemExit:
+      raise UnresolvedOrderError(f"{market} order sent but not found")
+    return order_id, sent["at"]
+
+  # Close a filled leg after the other leg failed
+  async def unwind_leg(self, market, side, size, price):
+    print(f"{market}: Unwinding filled leg...")
+    close_side = "SELL" if side == "BUY" else "BUY"
+    try:
+      (close_order, order_id) = await place_market_order(
+        self.client,
+        market=market,
+        side=close_side,
+        size=size,
+        price=price,
+        reduce_only=True
+      )
+
+      # Ensure order is filled before proceeding
+      order_status_close_order = await self.client.order_tracker.wait_for_status(order_id, ["FILLED", "CANCELED"], ORDER_CLOSE_TIMEOUT)
+    except Exception as e:
+      self.order_dict["pair_status"] = "ERROR"
+      self.order_dict["comments"] = f"Close {market}: , {e}"
+      print("ABORT PROGRAM")
+      print("Unexpected Error")
+      print(e)
+
+      # Send Message
+      send_message("Failed to execute. Code red. Error code: 101")
+
+      # ABORT
+      exit(1)
+
+    if order_status_close_order != "FILLED":
+      print("ABORT PROGRAM")
+      print("Unexpected Error")
+      print(order_status_close_order)
+
+      # Send Message
+      send_message("Failed to execute. Code red. Error code: 100")
+
+      # ABORT
+      exit(1)
+
+  # Open trades - both legs sent together and fills tracked in parallel
+  async def open_trades_concurrent(self):
+
+    # Print status
+    print("---")
+    print(f"{self.market_1} and {self.market_2}: Placing both orders...")
+    print(f"{self.market_1} Side: {self.base_side}, Size: {self.base_size}, Price: {self.base_price}, zscore: {self.z_score} ")
+    print(f"{self.market_2} Side: {self.quote_side}, Size: {self.quote_size}, Price: {self.quote_price}, zscore: {self.z_score} ")
+    print("---")
+
+    # Place both orders
+    (result_m1, result_m2) = await asyncio.gather(
+      self.place_leg(self.market_1, self.base_side, self.base_size, self.base_price),
+      self.place_leg(self.market_2, self.quote_side, self.quote_size, self.quote_price),
+      return_exceptions=True
+    )
+    placed_m1 = not isinstance(result_m1, BaseException)
+    placed_m2 = not isinstance(result_m2, BaseException)
+
+    # Store the order ids and time skew between legs
+    if placed_m1:
+      self.order_dict["order_id_m1"] = result_m1[0]
+      self.order_dict["order_time_m1"] = datetime.now().isoformat()
+    if placed_m2:
+      self.order_dict["order_id_m2"] = result_m2[0]
+      self.order_dict["order_time_m2"] = datetime.now().isoformat()
+    if placed_m1 and placed_m2:
+      self.order_dict["leg_skew_ms"] = round(abs(result_m1[1] - result_m2[1]) * 1000, 1)
+      print(f"Both orders sent, leg skew {self.order_dict['leg_skew_ms']} ms")
+
+    # Check fills in parallel
+    print("Checking order statuses...")
+    (status_m1, status_m2) = await asyncio.gather(
+      self.check_order_status_by_id(result_m1[0]) if placed_m1 else asyncio.sleep(0, "failed"),
+      self.check_order_status_by_id(result_m2[0]) if placed_m2 else asyncio.sleep(0, "failed"),
+    )
+    live_m1 = status_m1 == "live"
+    live_m2 = status_m2 == "live"
+
+    # Return success result
+    if live_m1 and live_m2:
+      print("")
+      print("SUCCESS: LIVE PAIR")
+      print(f"{self.market_1}:{self.base_side} and {self.market_2}:{self.quote_side}, zscore: {self.z_score}, half-life: {self.half_life}")
+      print("")
+      send_message(f"{self.market_1}:{self.base_side} and {self.market_2}:{self.quote_side}, zscore: {self.z_score}, half-life: {self.half_life}")
+      self.order_dict["pair_status"] = "LIVE"
+      return self.order_dict
+
+    # Record failure
+    self.order_dict["pair_status"] = "ERROR"
+    if not placed_m1 or not placed_m2:
+      failed_market = self.market_1 if not placed_m1 else self.market_2
+      error = result_m1 if not placed_m1 else result_m2
+      print(error)
+      self.order_dict["comments"] = f"Market {failed_market}: , {error}"
+    else:
+      failed_market = self.market_1 if not live_m1 else self.market_2
+      self.order_dict["comments"] = f"{failed_market} failed to fill"
+
+    # Unwind whatever filled - the full size of a live leg, or the partial fill of a leg that was cancelled
+    legs = [
+      (self.market_1, self.base_side, self.base_size, self.accept_failsafe_base_price, live_m1, result_m1[0] if placed_m1 else None),
+      (self.market_2, self.quote_side, self.quote_size, self.accept_failsafe_quote_price, live_m2, result_m2[0] if placed_m2 else None),
+    ]
+    for (market, side, size, price, live, order_id) in legs:
+      filled = size if live else (await self.filled_size(order_id) if order_id else 0)
+      if float(filled) > 0:
+        await self.unwind_leg(market, side, filled, price)
+
+    # Guard: A leg that was sent but never resolved may have filled, so abort once the other leg is closed
+    if isinstance(result_m1, UnresolvedOrderError) or isinstance(result_m2, UnresolvedOrderError):
+      print("ABORT PROGRAM")
+      print("Warning: Unable to detect latest order. Please check dashboard")
+
+      # Send Message
+      send_message(f"Failed to execute. Code red. Error code: 102 ({self.order_dict['comments']})")
+
+      # ABORT
+      exit(1)
+    return self.order_dict
@@ -0,0 +1,94 @@
+from constants import RESOLUTION, CANDLE_OPEN_REFRESH_SECONDS
+from func_utils import RESOLUTION_SECONDS, iso_to_epoch, candle_start
+from func_public import fetch_candles
+import numpy as np
+import asyncio
+import time
+
+
+# Class: Recent candles cache
+class RecentCandleCache:
+
+  """
+    Caches recent candles per (market, RESOLUTION) shared through the Client
+    Closed candles stay valid until the next candle boundary, when only the new candles are fetched
+    The still-open last candle is refreshed at most every CANDLE_OPEN_REFRESH_SECONDS (None holds it until the boundary)
+  """
+
+  def __init__(self, client, open_refresh_seconds=CANDLE_OPEN_REFRESH_SECONDS):
+    self.client = client
+    self.open_refresh_seconds = open_refresh_seconds
+    self.resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+    self.entries = {}
+    self.locks = {}
+
+  # Fetch candles as ascending (started_at, close) arrays
+  async def fetch(self, market, limit=None):
+    if limit is None:
+      response = await fetch_candles(self.client, market)
+    else:
+      response = await fetch_candles(self.client, market, limit = limit)
+    candles = response["candles"][::-1]
+    started_at = np.array([iso_to_epoch(candle["startedAt"]) for candle in candles], dtype=np.int64)
+    closes = np.array([candle["close"] for candle in candles]).astype(np.float64)
+    return started_at, closes
+
+  # Merge newer candles into a cached entry, keeping its length
+  def merge(self, entry, started_at, closes):
+    keep = started_at >= entry["started_at"][-1]
+    if not keep.any():
+      return
+    first_new = started_at[keep][0]
+    old = entry["started_at"] < first_new
+    size = len(entry["started_at"])
+    entry["started_at"] = np.concatenate([entry["started_at"][old], started_at[keep]])[-size:]
+    entry["closes"] = np.concatenate([entry["closes"][old], closes[keep]])[-size:]
+
+  # Get up to date cache entry for market
+  async def get_entry(self, market):
+    lock = self.locks.setdefault(market, asyncio.Lock())
+    async with lock:
+      now = time.time()
+      current_start = candle_start(now, RESOLUTION)
+      entry = self.entries.get(market)
+
+      # Fetch full series if not cached (or too far behind to catch up incrementally)
+      if entry is not None and len(entry["started_at"]) > 0:
+        n_new = (current_start - int(entry["started_at"][-1])) // self.resolution_seconds
+      if entry is None or len(entry["started_at"]) == 0 or n_new >= len(entry["started_at"]) - 1:
+        (started_at, closes) = await self.fetch(market)
+        entry = {"started_at": started_at, "closes": closes, "open_refreshed": now}
+        self.entries[market] = entry
+
+      # Candle boundary passed - fetch the new candles plus the final close of the last cached candle
+      elif n_new > 0:
+        (started_at, closes) = await self.fetch(market, n_new + 1)
+        self.merge(entry, started_at, closes)
+        entry["open_refreshed"] = now
+
+      # Same candle - refresh only the still-open last candle
+      elif self.open_refresh_seconds is not None and now - entry["open_refreshed"] >= self.open_refresh_seconds:
+        (started_at, closes) = await self.fetch(market, 1)
+        self.merge(entry, started_at, closes)
+        entry["open_refreshed"] = now
+
+      return entry
+
+  # Get recent close prices (oldest first)
+  async def get_closes(self, market):
+    entry = await self.get_entry(market)
+    return entry["closes"].copy()
+
+  # Get start time of the latest cached candle
+  def last_started_at(self, market):
+    entry = self.entries.get(market)
+    if entry is None or len(entry["started_at"]) == 0:
+      return None
+    return int(entry["started_at"][-1])
+
+  # Drop cached candles for a market (or all markets)
+  def invalidate(self, market=None):
+    if market is None:
+      self.entries = {}
+    else:
+      self.entries.pop(market, None)
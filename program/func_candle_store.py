@@ -0,0 +1,108 @@
+from constants import CANDLE_STORE_PATH
+import numpy as np
+import sqlite3
+
+
+# Class: Local candle store
+class CandleStore:
+
+  """
+    On-disk store of candle close prices keyed by (market, resolution)
+    Lets historical candle requests fetch only what is newer than the last stored candle
+    Records the earliest candle start already fetched per market, so a longer history window knows what to backfill
+  """
+
+  def __init__(self, path=CANDLE_STORE_PATH):
+    self.path = path
+    self.conn = sqlite3.connect(path)
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS candles (
+        market TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        started_at INTEGER NOT NULL,
+        close REAL NOT NULL,
+        PRIMARY KEY (market, resolution, started_at)
+      ) WITHOUT ROWID
+    """)
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS coverage (
+        market TEXT NOT NULL,
+        resolution TEXT NOT NULL,
+        covered_from INTEGER NOT NULL,
+        PRIMARY KEY (market, resolution)
+      ) WITHOUT ROWID
+    """)
+    self.conn.commit()
+
+  # Get start time (epoch seconds) of the latest stored candle
+  def last_started_at(self, market, resolution):
+    row = self.conn.execute(
+      "SELECT MAX(started_at) FROM candles WHERE market = ? AND resolution = ?",
+      (market, resolution)
+    ).fetchone()
+    return row[0]
+
+  # Get earliest candle start (epoch seconds) already fetched - the first stored candle if not recorded
+  def covered_from(self, market, resolution):
+    row = self.conn.execute(
+      "SELECT covered_from FROM coverage WHERE market = ? AND resolution = ?",
+      (market, resolution)
+    ).fetchone()
+    if row is not None:
+      return row[0]
+    row = self.conn.execute(
+      "SELECT MIN(started_at) FROM candles WHERE market = ? AND resolution = ?",
+      (market, resolution)
+    ).fetchone()
+    return row[0]
+
+  # Record that candles from a start time onwards have been fetched
+  def set_covered_from(self, market, resolution, started_at):
+    self.conn.execute(
+      "INSERT OR REPLACE INTO coverage (market, resolution, covered_from) VALUES (?, ?, ?)",
+      (market, resolution, started_at)
+    )
+    self.conn.commit()
+
+  # Delete candles that started before a time, returning the number deleted
+  def prune(self, market, resolution, before):
+    deleted = self.conn.execute(
+      "DELETE FROM candles WHERE market = ? AND resolution = ? AND started_at < ?",
+      (market, resolution, before)
+    ).rowcount
+    self.conn.commit()
+    return deleted
+
+  # Save candles as (started_at, close) rows, replacing any already stored
+  def save(self, market, resolution, rows):
+    self.conn.executemany(
+      "INSERT OR REPLACE INTO candles (market, resolution, started_at, close) VALUES (?, ?, ?, ?)",
+      [(market, resolution, started_at, close) for (started_at, close) in rows]
+    )
+    self.conn.commit()
+
+  # Load (started_at, close) rows from a start time onwards, oldest first
+  def load(self, market, resolution, since=0):
+    return self.conn.execute(
+      "SELECT started_at, close FROM candles WHERE market = ? AND resolution = ? AND started_at >= ? ORDER BY started_at",
+      (market, resolution, since)
+    ).fetchall()
+
+  # Load rows from a start time onwards as (started_at, close) arrays
+  def load_arrays(self, market, resolution, since=0):
+    rows = self.load(market, resolution, since)
+    started_at = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    closes = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    return started_at, closes
+
+  # List markets stored for a resolution
+  def markets(self, resolution):
+    rows = self.conn.execute(
+      "SELECT DISTINCT market FROM candles WHERE resolution = ? ORDER BY market",
+      (resolution,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+  # Close connection
+  def close(self):
+    self.conn.close()
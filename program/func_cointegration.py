@@ -3,8 +3,23 @@ import numpy as np
 import statsmodels.api as sm
 from statsmodels.tsa.stattools import coint
 from scipy.stats import linregress
-from constants import MAX_HALF_LIFE, WINDOW
+from constants import RESOLUTION, MAX_HALF_LIFE, WINDOW, COINT_ENGINE, COINT_PRESCREEN, COINT_PRESCREEN_TSTAT, COINT_WORKERS
+from func_engle_granger import engle_granger, engle_granger_batch
+from func_utils import RESOLUTION_SECONDS
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import multiprocessing
 import warnings
+import os
+
+# Price matrix attached from shared memory in pool workers
+_worker_shm = None
+_worker_prices = None
+
+# Pool workers start from a fresh process rather than a fork, as the daemon runs the pair search from a thread of a process
+# already running network and notifier threads, where forking can deadlock
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
 
 class SmartError(Exception):
     pass
@@ -20,6 +35,17 @@ def half_life_mean_reversion(series):
     half_life = -np.log(2) / slope
     return half_life
 
+def half_life_mean_reversion_batch(spreads):
+    # Half life of every column of a matrix of spreads (NaN where it cannot be calculated)
+    lagged = spreads[:-1] - spreads[:-1].mean(axis=0)
+    difference = np.diff(spreads, axis=0)
+    difference = difference - difference.mean(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (lagged * difference).sum(axis=0) / (lagged * lagged).sum(axis=0)
+        half_life = -np.log(2) / slope
+    half_life[~(np.abs(slope) >= np.finfo(np.float64).eps)] = np.nan
+    return half_life
+
 def calculate_zscore(spread):
     spread_series = pd.Series(spread)
     mean = spread_series.rolling(center=False, window=WINDOW).mean()
@@ -28,7 +54,106 @@ def calculate_zscore(spread):
     zscore = (x - mean) / std
     return zscore
 
-def calculate_cointegration(series_1, series_2):
+def calculate_zscore_last(spread, window=WINDOW):
+    # Latest z-score only (same as calculate_zscore(spread).values[-1]), along axis 0 for a matrix of spreads
+    spread = np.asarray(spread, dtype=np.float64)
+    if spread.shape[0] < window:
+        return np.full(spread.shape[1:], np.nan) if spread.ndim > 1 else np.nan
+    tail = spread[-window:]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (spread[-1] - tail.mean(axis=0)) / tail.std(axis=0, ddof=1)
+
+def calculate_zscore_rolling(spreads, window=WINDOW, block=1024):
+    # Z-score at every row (same as calculate_zscore per column), for a matrix of spreads (candles x pairs)
+    # Rows before a full window are NaN; worked in blocks of rows to bound memory
+    spreads = np.asarray(spreads, dtype=np.float64)
+    zscores = np.full(spreads.shape, np.nan)
+    for start in range(window - 1, spreads.shape[0], block):
+        stop = min(start + block, spreads.shape[0])
+        windows = np.lib.stride_tricks.sliding_window_view(spreads[start - window + 1:stop], window, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            zscores[start:stop] = (spreads[start:stop] - windows.mean(axis=-1)) / windows.std(axis=-1, ddof=1)
+    return zscores
+
+class RollingZScore:
+    """
+    Streaming z-score of a pair spread over the last WINDOW candles
+    Keeps Welford-style rolling mean and sum of squared deviations so each new candle costs O(1)
+    Streaming mode for following one pair candle by candle - func_signals scans many pairs at once with calculate_zscore_last
+    """
+
+    # Re-seed from the window after this many updates to stop rounding drift building up
+    RESEED_UPDATES = 1000
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.started_at = None
+        self.updates = 0
+
+    def seed(self, spread):
+        # Reset from the latest values of a spread series - O(WINDOW)
+        self.values.clear()
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+        for value in np.asarray(spread, dtype=np.float64)[-self.window:]:
+            self.push(float(value))
+
+    def push(self, value):
+        # Add a new value, dropping the oldest once the window is full
+        if len(self.values) < self.window:
+            self.values.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+        else:
+            self.swap(self.values[0], value)
+            self.values.append(value)
+        self.updates += 1
+
+    def replace_last(self, value):
+        # Replace the latest value (the still-open candle moved)
+        if len(self.values) == 0:
+            return self.push(value)
+        self.swap(self.values[-1], value)
+        self.values[-1] = value
+        self.updates += 1
+
+    def swap(self, old, new):
+        # Update mean and squared deviations for replacing one value in the window by another
+        old_mean = self.mean
+        self.mean += (new - old) / len(self.values)
+        self.m2 = max(self.m2 + (new - old) * (new - self.mean + old - old_mean), 0.0)
+
+    @property
+    def zscore(self):
+        if len(self.values) < self.window or self.m2 <= 0:
+            return np.nan
+        std = np.sqrt(self.m2 / (len(self.values) - 1))
+        return (self.values[-1] - self.mean) / std
+
+    def update(self, spread, started_at):
+        """
+        Sync with the latest spread series whose last candle started at started_at (epoch seconds)
+        Same candle updates the last value, the next candle finalises it and pushes the new one, anything else re-seeds
+        """
+        resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+        if started_at is None or self.started_at is None or len(spread) < 2 or self.updates >= self.RESEED_UPDATES:
+            self.seed(spread)
+        elif started_at == self.started_at:
+            self.replace_last(float(spread[-1]))
+        elif started_at == self.started_at + resolution_seconds:
+            self.replace_last(float(spread[-2]))
+            self.push(float(spread[-1]))
+        else:
+            self.seed(spread)
+        self.started_at = started_at
+        return self.zscore
+
+def calculate_cointegration(series_1, series_2, engine=COINT_ENGINE):
     series_1 = np.array(series_1).astype(np.float64)
     series_2 = np.array(series_2).astype(np.float64)
     
@@ -39,16 +164,22 @@ def calculate_cointegration(series_1, series_2):
     with warnings.catch_warnings():
         warnings.filterwarnings("ignore", category=Warning)
         try:
-            coint_res = coint(series_1, series_2)
-            coint_t = coint_res[0]
-            p_value = coint_res[1]
-            critical_value = coint_res[2][1]
+            if engine == "numpy":
 
-            # Better way to fit data vs older version
-            series_2_with_constant = sm.add_constant(series_2) 
-            model = sm.OLS(series_1, series_2_with_constant).fit()
-            hedge_ratio = model.params[1]
-            intercept = model.params[0]
+                # Built-in Engle-Granger with fixed-lag ADF (see func_engle_granger)
+                coint_t, p_value, critical_values, hedge_ratio, intercept = engle_granger(series_1, series_2)
+                critical_value = critical_values[1]
+            else:
+                coint_res = coint(series_1, series_2)
+                coint_t = coint_res[0]
+                p_value = coint_res[1]
+                critical_value = coint_res[2][1]
+
+                # Better way to fit data vs older version
+                series_2_with_constant = sm.add_constant(series_2) 
+                model = sm.OLS(series_1, series_2_with_constant).fit()
+                hedge_ratio = model.params[1]
+                intercept = model.params[0]
 
             spread = series_1 - (series_2 * hedge_ratio) - intercept
             half_life = half_life_mean_reversion(spread)
@@ -60,36 +191,183 @@ def calculate_cointegration(series_1, series_2):
             print(f"Cointegration calculation failed: {str(e)}")
             return 0, None, None
 
-def store_cointegration_results(df_market_prices):
-    # Initialize
-    markets = df_market_prices.columns.to_list()
+def prescreen_pairs(prices, max_half_life=MAX_HALF_LIFE):
+    """
+    Screen all pairs at once with matrix operations over the price matrix (candles x markets)
+    For each pair [i, j] (i as base) computes the OLS hedge ratio and a Dickey-Fuller regression
+    (no lags) of the spread, all from cross-product matrices
+    Returns a boolean matrix marking pairs i < j worth the full Engle-Granger test
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    n_obs, n_markets = prices.shape
+    if n_obs < 4 or n_markets < 2:
+        return np.zeros((n_markets, n_markets), dtype=bool)
+
+    # Hedge ratios from regressing each base on each quote (with constant)
+    centered = prices - prices.mean(axis=0)
+    cov = centered.T @ centered
+    var = np.diag(cov)
+
+    # Cross-products of lagged levels and differences (centered, as the regression has a constant)
+    lagged = prices[:-1] - prices[:-1].mean(axis=0)
+    diffs = np.diff(prices, axis=0)
+    diffs = diffs - diffs.mean(axis=0)
+    ll = lagged.T @ lagged
+    ld = lagged.T @ diffs
+    dd = diffs.T @ diffs
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hedge_ratio = cov / var[np.newaxis, :]
+        resid_var = (var[:, np.newaxis] - hedge_ratio * cov) / n_obs
+
+        # Sums for spread_t = base_t - hedge_ratio * quote_t
+        ll_diag = np.diag(ll)
+        ld_diag = np.diag(ld)
+        dd_diag = np.diag(dd)
+        s_ll = ll_diag[:, np.newaxis] - 2 * hedge_ratio * ll + hedge_ratio ** 2 * ll_diag[np.newaxis, :]
+        s_ld = ld_diag[:, np.newaxis] - hedge_ratio * (ld + ld.T) + hedge_ratio ** 2 * ld_diag[np.newaxis, :]
+        s_dd = dd_diag[:, np.newaxis] - 2 * hedge_ratio * dd + hedge_ratio ** 2 * dd_diag[np.newaxis, :]
+
+        # Dickey-Fuller slope, t-statistic and half life (same regression as half_life_mean_reversion)
+        gamma = s_ld / s_ll
+        ssr = s_dd - gamma * s_ld
+        t_stat = gamma / np.sqrt(ssr / (n_obs - 3) / s_ll)
+        half_life = -np.log(2) / gamma
+
+    # Keep pairs which could pass the full test
+    candidates = (
+        (resid_var > 0)
+        & (t_stat < COINT_PRESCREEN_TSTAT)
+        & (half_life > 0)
+        & (half_life <= max_half_life * (1 + 1e-9))
+    )
+    return np.triu(candidates, k=1)
+
+def test_pairs_batch(prices, pairs):
+    # Numpy engine for many pairs at once - same decisions as calculate_cointegration with engine "numpy"
+    base_index = np.array([pair[0] for pair in pairs], dtype=np.intp)
+    quote_index = np.array([pair[1] for pair in pairs], dtype=np.intp)
+    series_1 = prices[:, base_index]
+    series_2 = prices[:, quote_index]
+    coint_t, p_value, critical_values, hedge_ratio, intercept = engle_granger_batch(series_1, series_2)
+    half_life = half_life_mean_reversion_batch(series_1 - series_2 * hedge_ratio - intercept)
+
+    # Identical or constant series and failed calculations are not cointegrated
+    valid = (
+        (series_1.var(axis=0) > 0)
+        & (series_2.var(axis=0) > 0)
+        & ~(series_1 == series_2).all(axis=0)
+        & ~np.isnan(coint_t)
+        & ~np.isnan(half_life)
+    )
+    results = []
+    for k in range(len(pairs)):
+        if not valid[k]:
+            results.append((0, None, None))
+            continue
+        coint_flag = 1 if p_value[k] < 0.05 and coint_t[k] < critical_values[1] else 0
+        results.append((coint_flag, hedge_ratio[k], half_life[k]))
+    return results
+
+def test_pairs(prices, pairs, engine=COINT_ENGINE):
+    # Run the full test on (base_index, quote_index) pairs, returning (coint_flag, hedge_ratio, half_life) for each
+    if engine == "numpy" and len(pairs) > 0:
+        return test_pairs_batch(prices, pairs)
+    results = []
+    for base_index, quote_index in pairs:
+        results.append(calculate_cointegration(prices[:, base_index], prices[:, quote_index], engine))
+    return results
+
+def _init_worker(shm_name, shape):
+    # Attach pool worker to the shared price matrix (the parent owns and unlinks it)
+    global _worker_shm, _worker_prices
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    _worker_prices = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+
+def _test_pairs_worker(pairs, engine=COINT_ENGINE):
+    return test_pairs(_worker_prices, pairs, engine)
+
+def test_pairs_parallel(prices, pairs_chunks, workers, engine=COINT_ENGINE):
+    # Run chunks of pairs across a process pool, sharing the price matrix through shared memory
+    # Results come back in chunk order so output matches a serial run
+    shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+    try:
+        shared_prices = np.ndarray(prices.shape, dtype=np.float64, buffer=shm.buf)
+        shared_prices[:] = prices
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(POOL_START_METHOD), initializer=_init_worker, initargs=(shm.name, prices.shape)) as executor:
+            results = []
+            for chunk_results in executor.map(_test_pairs_worker, pairs_chunks, [engine] * len(pairs_chunks)):
+                results.extend(chunk_results)
+        del shared_prices
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+def chunk_pairs_by_base(pairs, n_chunks):
+    # Split pairs (ordered by base market) into about n_chunks chunks without splitting a base market
+    target = max(1, -(-len(pairs) // n_chunks))
+    chunks = []
+    chunk = []
+    for position, pair in enumerate(pairs):
+        chunk.append(pair)
+        is_base_end = position == len(pairs) - 1 or pairs[position + 1][0] != pair[0]
+        if is_base_end and len(chunk) >= target:
+            chunks.append(chunk)
+            chunk = []
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def find_cointegrated_pairs(prices, markets, max_half_life=MAX_HALF_LIFE, workers=COINT_WORKERS, engine=COINT_ENGINE, verbose=True):
+    # Pairs of a price matrix (candles x markets) meeting the cointegration and half life criteria, ordered by base then quote
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
     criteria_met_pairs = []
 
+    # Select pairs to test
+    if COINT_PRESCREEN:
+        candidates = prescreen_pairs(prices, max_half_life)
+        if verbose:
+            print(f"Pre-screen kept {int(candidates.sum())} of {len(markets) * (len(markets) - 1) // 2} pairs")
+    else:
+        candidates = np.triu(np.ones((len(markets), len(markets)), dtype=bool), k=1)
+
+    # Pairs to test, ordered by base market then quote market
+    pairs = [(int(index), int(quote_index)) for index, quote_index in zip(*np.nonzero(candidates))]
+
+    # Check cointegration - statsmodels pairs across a process pool when there is enough work
+    # The numpy engine tests every pair in one vectorised batch, faster than starting a pool
+    workers = workers or os.cpu_count() or 1
+    if engine != "numpy" and workers > 1 and len(pairs) >= 4 * workers:
+        if verbose:
+            print(f"Testing {len(pairs)} pairs across {workers} processes")
+        results = test_pairs_parallel(prices, chunk_pairs_by_base(pairs, 4 * workers), workers, engine)
+    else:
+        results = test_pairs(prices, pairs, engine)
+
     # Find cointegrated pairs
-    # Start with our base pair
-    for index, base_market in enumerate(markets[:-1]):
-        series_1 = df_market_prices[base_market].values.astype(np.float64).tolist()
-
-        # Get Quote Pair
-        for quote_market in markets[index + 1:]:
-            series_2 = df_market_prices[quote_market].values.astype(np.float64).tolist()
-
-            # Check cointegration
-            coint_flag, hedge_ratio, half_life = calculate_cointegration(series_1, series_2)
-
-            # Log pair
-            if coint_flag == 1 and half_life is not None and half_life <= MAX_HALF_LIFE and half_life > 0:
-                criteria_met_pairs.append({
-                    "base_market": base_market,
-                    "quote_market": quote_market,
-                    "hedge_ratio": hedge_ratio,
-                    "half_life": half_life,
-                })
+    for (index, quote_index), (coint_flag, hedge_ratio, half_life) in zip(pairs, results):
+
+        # Log pair
+        if coint_flag == 1 and half_life is not None and half_life <= max_half_life and half_life > 0:
+            criteria_met_pairs.append({
+                "base_market": markets[index],
+                "quote_market": markets[quote_index],
+                "hedge_ratio": hedge_ratio,
+                "half_life": half_life,
+            })
+    return criteria_met_pairs
+
+def store_cointegration_results(df_market_prices, engine=COINT_ENGINE):
+    # Find cointegrated pairs
+    markets = df_market_prices.columns.to_list()
+    criteria_met_pairs = find_cointegrated_pairs(df_market_prices.values, markets, engine=engine)
 
     # Create and save DataFrame
     if criteria_met_pairs:
         df_criteria_met = pd.DataFrame(criteria_met_pairs)
-        df_criteria_met.to_csv("cointegrated_pairs.csv")
+        df_criteria_met.to_csv("cointegrated_pairs.csv.tmp")
+        os.replace("cointegrated_pairs.csv.tmp", "cointegrated_pairs.csv")
         del df_criteria_met
         print("Cointegrated pairs successfully saved")
     else:
@@ -1,20 +1,44 @@
 from dydx_v4_client import NodeClient, Wallet
 from dydx_v4_client.indexer.rest.indexer_client import IndexerClient
 from dydx_v4_client.network import TESTNET
-from constants import INDEXER_ACCOUNT_ENDPOINT, INDEXER_ENDPOINT_MAINNET, MNEMONIC, DYDX_ADDRESS, MARKET_DATA_MODE
+from constants import INDEXER_ACCOUNT_ENDPOINT, INDEXER_ENDPOINT_MAINNET, INDEXER_WS_ENDPOINT, MNEMONIC, DYDX_ADDRESS, MARKET_DATA_MODE, SIMULATE_EXCHANGE
 from func_public import get_candles_recent
+from func_rate_limit import RateLimiter
+from func_candle_store import CandleStore
+from func_market_cache import MarketCache
+from func_candle_cache import RecentCandleCache
+from func_order_tracker import OrderTracker
+from func_block_height import BlockHeightTracker
+from func_account import AccountSnapshot
+from func_position_store import PositionStore
 
 # Client Class
 class Client:
-  def __init__(self, indexer, indexer_account, node, wallet):
+  def __init__(self, indexer, indexer_account, node, wallet, candle_store=None, position_store=None):
     self.indexer = indexer
     self.indexer_account = indexer_account
     self.node = node
     self.wallet = wallet
+    self.limiter = RateLimiter()
+    self.candle_store = candle_store if candle_store is not None else CandleStore()
+    self.position_store = position_store if position_store is not None else PositionStore()
+    self.market_cache = MarketCache(self)
+    self.candle_cache = RecentCandleCache(self)
+    self.market_stream = None
+    self.ws_endpoint = INDEXER_WS_ENDPOINT
+    self.pairs = None
+    self.order_tracker = OrderTracker(self)
+    self.blocks = BlockHeightTracker(self)
+    self.account = AccountSnapshot(self)
 
 # Connect to DYDX
 async def connect_dydx():
 
+  # Simulated exchange (no network)
+  if SIMULATE_EXCHANGE:
+    from func_simulator import connect_simulated
+    return await connect_simulated()
+
   # Determine market data endpoint
   market_data_endpoint = INDEXER_ENDPOINT_MAINNET if MARKET_DATA_MODE != "TESTNET" else INDEXER_ACCOUNT_ENDPOINT
 
@@ -0,0 +1,71 @@
+from constants import COINT_REFRESH_SECONDS
+from func_public import construct_market_prices
+from func_cointegration import store_cointegration_results
+from func_messaging import send_message
+import pandas as pd
+import asyncio
+import time
+import os
+
+
+# Get age of the saved cointegrated pairs in seconds (None if missing)
+def get_pairs_age():
+  try:
+    return time.time() - os.path.getmtime("cointegrated_pairs.csv")
+  except OSError:
+    return None
+
+
+# Load pair universe into the client (swapped by reference so readers always see a complete set)
+async def load_pairs(client):
+  pairs = pd.read_csv("cointegrated_pairs.csv")
+  client.pairs = pairs
+  if client.market_stream is not None:
+    await client.market_stream.subscribe(sorted(set(pairs["base_market"]) | set(pairs["quote_market"])))
+  return pairs
+
+
+# Rebuild cointegrated pairs without pausing trading
+async def refresh_pairs(client):
+  print("Refreshing cointegrated pairs in background...")
+  df_market_prices = await construct_market_prices(client)
+
+  # Statistics run in a worker thread so the event loop keeps trading
+  stores_result = await asyncio.to_thread(store_cointegration_results, df_market_prices)
+  if stores_result != "saved":
+    raise Exception("Error saving cointegrated pairs")
+
+  pairs = await load_pairs(client)
+  print(f"Cointegrated pairs refreshed: {len(pairs)} pairs")
+
+
+# Refresh cointegrated pairs on schedule
+async def refresh_pairs_loop(client, first_delay=COINT_REFRESH_SECONDS):
+  delay = max(first_delay, 0)
+  while True:
+    await asyncio.sleep(delay)
+    try:
+      await refresh_pairs(client)
+      delay = COINT_REFRESH_SECONDS
+    except Exception as e:
+
+      # Keep trading the current pairs and try again sooner
+      print(f"Error refreshing cointegrated pairs: {e}")
+      send_message(f"Error refreshing cointegrated pairs {e}")
+      delay = min(COINT_REFRESH_SECONDS, 600)
+
+
+# Keep a background task running, restarting it with backoff if it fails
+async def supervise(name, func, *args):
+  delay = 5
+  while True:
+    try:
+      await func(*args)
+      return
+    except asyncio.CancelledError:
+      raise
+    except Exception as e:
+      print(f"Background task {name} failed: {e}. Restarting in {delay} seconds")
+      send_message(f"Background task {name} failed {e}")
+      await asyncio.sleep(delay)
+      delay = min(delay * 2, 600)
@@ -0,0 +1,130 @@
+from constants import COINT_ADF_LAGS
+import numpy as np
+import math
+
+# MacKinnon (1994) p-value surface for the Engle-Granger test with a constant and two series (N = 2)
+# Same coefficients statsmodels uses in mackinnonp(regression="c", N=2)
+TAU_MAX = 0.92
+TAU_MIN = -18.86
+TAU_STAR = -2.62
+TAU_SMALL_P = [2.92, 1.5012, 0.039796]
+TAU_LARGE_P = [2.1945, 0.64695, -0.29198, -0.042377]
+
+# MacKinnon (2010) critical values (1%, 5%, 10%) as coefficients of 1 / nobs, constant and two series
+TAU_CRITICAL = [
+  [-3.89644, -10.9519, -33.527, 0.0],
+  [-3.33613, -6.1101, -6.823, 0.0],
+  [-3.04445, -4.2412, -2.72, 0.0],
+]
+
+# Residuals are treated as perfectly colinear above this R-squared (as in statsmodels)
+COLINEAR_RSQUARED = 1 - 100 * math.sqrt(np.finfo(np.float64).eps)
+
+
+# Evaluate polynomial with coefficients in increasing order of power
+def polyval_increasing(coefficients, x):
+  return sum(c * x ** i for i, c in enumerate(coefficients))
+
+
+# MacKinnon approximate p-value for an Engle-Granger t-statistic
+def mackinnon_p_value(t_stat):
+  if t_stat > TAU_MAX:
+    return 1.0
+  if t_stat < TAU_MIN:
+    return 0.0
+  coefficients = TAU_SMALL_P if t_stat <= TAU_STAR else TAU_LARGE_P
+  z = polyval_increasing(coefficients, t_stat)
+  return 0.5 * (1 + math.erf(z / math.sqrt(2)))
+
+
+# MacKinnon critical values (1%, 5%, 10%) for a sample size
+def mackinnon_critical_values(nobs):
+  return np.array([polyval_increasing(row, 1 / nobs) for row in TAU_CRITICAL])
+
+
+# ADF t-statistic with a fixed number of lags and no constant (used on cointegrating residuals)
+def adf_t_stat(series, lags):
+  diff = np.diff(series)
+  n = len(diff) - lags
+  y = diff[lags:]
+  x = np.empty((n, lags + 1))
+  x[:, 0] = series[lags:-1]
+  for lag in range(1, lags + 1):
+    x[:, lag] = diff[lags - lag:-lag]
+  beta, _, _, _ = np.linalg.lstsq(x, y, rcond=None)
+  resid = y - x @ beta
+  sigma2 = resid @ resid / (n - lags - 1)
+  xtx_inv = np.linalg.inv(x.T @ x)
+  return beta[0] / math.sqrt(sigma2 * xtx_inv[0, 0])
+
+
+# Two-step Engle-Granger test of series_1 against series_2
+def engle_granger(series_1, series_2, lags=COINT_ADF_LAGS):
+
+  """
+    Step 1 regresses series_1 on series_2 with a constant, step 2 runs a fixed-lag ADF on the residuals
+    Returns t-statistic, p-value, critical values (1%, 5%, 10%), hedge ratio and intercept
+  """
+
+  series_1 = np.asarray(series_1, dtype=np.float64)
+  series_2 = np.asarray(series_2, dtype=np.float64)
+  nobs = len(series_1)
+
+  # Cointegrating regression
+  x = np.column_stack([np.ones(nobs), series_2])
+  (intercept, hedge_ratio), _, _, _ = np.linalg.lstsq(x, series_1, rcond=None)
+  resid = series_1 - intercept - hedge_ratio * series_2
+
+  # Unit root test on residuals
+  centered = series_1 - series_1.mean()
+  rsquared = 1 - (resid @ resid) / (centered @ centered)
+  if rsquared < COLINEAR_RSQUARED:
+    t_stat = adf_t_stat(resid, lags)
+  else:
+    t_stat = -np.inf
+
+  # Return result
+  p_value = mackinnon_p_value(t_stat)
+  critical_values = mackinnon_critical_values(nobs - 1)
+  return t_stat, p_value, critical_values, hedge_ratio, intercept
+
+
+# Engle-Granger test of many pairs at once, with series_1 and series_2 as matrices (candles x pairs)
+# Same regressions as engle_granger, solved for all pairs together, returning arrays with one value per pair
+def engle_granger_batch(series_1, series_2, lags=COINT_ADF_LAGS):
+  series_1 = np.asarray(series_1, dtype=np.float64)
+  series_2 = np.asarray(series_2, dtype=np.float64)
+  nobs = series_1.shape[0]
+
+  # Cointegrating regressions
+  centered_1 = series_1 - series_1.mean(axis=0)
+  centered_2 = series_2 - series_2.mean(axis=0)
+  with np.errstate(divide="ignore", invalid="ignore"):
+    hedge_ratio = (centered_1 * centered_2).sum(axis=0) / (centered_2 * centered_2).sum(axis=0)
+    intercept = series_1.mean(axis=0) - hedge_ratio * series_2.mean(axis=0)
+    resid = series_1 - intercept - hedge_ratio * series_2
+    rsquared = 1 - (resid * resid).sum(axis=0) / (centered_1 * centered_1).sum(axis=0)
+
+  # Unit root tests on residuals (regressors are the lagged level and lagged differences)
+  diff = np.diff(resid, axis=0)
+  y = diff[lags:]
+  x = np.empty(y.shape + (lags + 1,))
+  x[..., 0] = resid[lags:-1]
+  for lag in range(1, lags + 1):
+    x[..., lag] = diff[lags - lag:-lag]
+  xtx = np.einsum("tpi,tpj->pij", x, x)
+  xty = np.einsum("tpi,tp->pi", x, y)
+  with np.errstate(divide="ignore", invalid="ignore"):
+    solvable = np.isfinite(xtx).all(axis=(1, 2)) & (np.abs(np.linalg.det(np.where(np.isfinite(xtx), xtx, 0))) > 0)
+    xtx_inv = np.full(xtx.shape, np.nan)
+    xtx_inv[solvable] = np.linalg.inv(xtx[solvable])
+    beta = np.einsum("pij,pj->pi", xtx_inv, xty)
+    adf_resid = y - np.einsum("tpi,pi->tp", x, beta)
+    sigma2 = (adf_resid * adf_resid).sum(axis=0) / (y.shape[0] - lags - 1)
+    t_stat = beta[:, 0] / np.sqrt(sigma2 * xtx_inv[:, 0, 0])
+  t_stat = np.where(rsquared < COLINEAR_RSQUARED, t_stat, -np.inf)
+
+  # Return result
+  p_value = np.array([mackinnon_p_value(t) if not np.isnan(t) else np.nan for t in t_stat])
+  critical_values = mackinnon_critical_values(nobs - 1)
+  return t_stat, p_value, critical_values, hedge_ratio, intercept
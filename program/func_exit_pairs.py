@@ -1,11 +1,10 @@
 from constants import CLOSE_AT_ZSCORE_CROSS
 from func_utils import format_number
-from func_cointegration import calculate_zscore
-from func_public import get_candles_recent, get_markets
-from func_private import place_market_order, get_open_positions, get_order
+from func_public import get_candles_recent_batch, get_markets
+from func_signals import build_pair_index, build_recent_matrix, pair_zscores
+from func_private import place_market_order, get_open_positions, get_orders
 from func_messaging import send_message
-import json
-import time
+import asyncio
 
 from pprint import pprint
 
@@ -17,32 +16,39 @@ async def manage_trade_exits(client):
     Based upon criteria set in constants
   """
 
-  # Initialize saving output
-  save_output = []
-
-  # Opening JSON file
-  try:
-    open_positions_file = open("bot_agents.json")
-    open_positions_dict = json.load(open_positions_file)
-  except:
-    return "complete"
+  # Get saved positions
+  open_positions_dict = client.position_store.open_positions()
 
   # Guard: Exit if no open positions in file
   if len(open_positions_dict) < 1:
     return "complete"
 
-  # Get all open positions per trading platform
-  exchange_pos = await get_open_positions(client)
+  # Get open positions, orders, prices and markets for all saved positions at once
+  # Filled orders are cached so only orders not yet final are requested again
+  order_ids = [position[key] for position in open_positions_dict for key in ["order_id_m1", "order_id_m2"]]
+  position_markets = [position[key] for position in open_positions_dict for key in ["market_1", "market_2"]]
+  (exchange_pos, orders, candles, markets) = await asyncio.gather(
+    get_open_positions(client),
+    get_orders(client, order_ids),
+    get_candles_recent_batch(client, position_markets),
+    get_markets(client),
+  )
+  orders = dict(zip(order_ids, orders))
+
+  # Get current z-score of every saved position in one pass
+  (signal_markets, base_index, quote_index) = build_pair_index(
+    [position["market_1"] for position in open_positions_dict],
+    [position["market_2"] for position in open_positions_dict],
+  )
+  matrix = build_recent_matrix(candles, signal_markets)
+  z_scores_current = pair_zscores(matrix, base_index, quote_index, [position["hedge_ratio"] for position in open_positions_dict])
 
   # Create live position tickers list
   markets_live = list(exchange_pos.keys())
 
-  # Protect API
-  time.sleep(0.5)
-
   # Check all saved positions match order record
   # Exit trade according to any exit trade rules
-  for position in open_positions_dict:
+  for (position, z_score_current) in zip(open_positions_dict, z_scores_current):
 
     # Initialize is_close trigger
     is_close = False
@@ -57,20 +63,14 @@ async def manage_trade_exits(client):
     position_size_m2 = position["order_m2_size"]
     position_side_m2 = position["order_m2_side"]
 
-    # Protect API
-    time.sleep(0.5)
-
     # Get order info m1 per exchange
-    order_m1 = await get_order(client, position["order_id_m1"])
+    order_m1 = orders[position["order_id_m1"]]
     order_market_m1 = order_m1["ticker"]
     order_size_m1 = order_m1["size"]
     order_side_m1 = order_m1["side"]
 
-    # Protect API Rate limits
-    time.sleep(0.5)
-
     # Get order info m2 per exchange
-    order_m2 = await get_order(client, position["order_id_m2"])
+    order_m2 = orders[position["order_id_m2"]]
     order_market_m2 = order_m2["ticker"]
     order_size_m2 = order_m2["size"]
     order_side_m2 = order_m2["side"]
@@ -93,26 +93,14 @@ async def manage_trade_exits(client):
       exit(1)
 
     # Get prices
-    series_1 = await get_candles_recent(client, position_market_m1)
-    time.sleep(0.2)
-    series_2 = await get_candles_recent(client, position_market_m2)
-    time.sleep(0.2)
-
-    # Get markets for reference of tick size
-    markets = await get_markets(client)
-
-    # Protect API
-    time.sleep(0.2)
+    series_1 = candles[position_market_m1]
+    series_2 = candles[position_market_m2]
 
     # Trigger close based on Z-Score
     if CLOSE_AT_ZSCORE_CROSS:
 
       # Initialize z_scores
-      hedge_ratio = position["hedge_ratio"]
       z_score_traded = position["z_score"]
-      if len(series_1) > 0 and len(series_1) == len(series_2):
-        spread = series_1 - (hedge_ratio * series_2)
-        z_score_current = calculate_zscore(spread).values.tolist()[-1]
 
       # Determine trigger
       z_score_level_check = abs(z_score_current) >= abs(z_score_traded)
@@ -172,9 +160,6 @@ async def manage_trade_exits(client):
         print(close_order_m1["id"])
         print(">>> <<<")
 
-        # Protect API
-        time.sleep(1)
-
         # Close position for market 2
         print(">>> Closing market 2 <<<")
         print(f"Closing position for {position_market_m2}")
@@ -192,16 +177,12 @@ async def manage_trade_exits(client):
         print(close_order_m2["id"])
         print(">>> <<<")
 
+        # Remove from saved positions
+        client.position_store.close(position["position_id"])
+
       except Exception as e:
         print(e)
         print(f"Exit failed for {position_market_m1} with {position_market_m2}")
-        save_output.append(position)
-
-    # Keep record if items and save
-    else:
-      save_output.append(position)
 
-  # Save remaining items
-  print(f"{len(save_output)} Items remaining. Saving file...")
-  with open("bot_agents.json", "w") as f:
-    json.dump(save_output, f)
\ No newline at end of file
+  # Report remaining items
+  print(f"{len(client.position_store.open_ids())} Items remaining.")
\ No newline at end of file
@@ -0,0 +1,71 @@
+from constants import MARKET_CACHE_TTL, ORACLE_PRICE_TTL
+import asyncio
+import time
+
+
+# Class: Perpetual market metadata cache
+class MarketCache:
+
+  """
+    Caches the perpetual markets response shared through the Client
+    Metadata (tick size, step size, clobPairId etc) expires after MARKET_CACHE_TTL
+    Oracle prices expire sooner (ORACLE_PRICE_TTL) and refresh without replacing metadata, only for callers reading prices
+  """
+
+  def __init__(self, client, ttl=MARKET_CACHE_TTL, oracle_ttl=ORACLE_PRICE_TTL):
+    self.client = client
+    self.ttl = ttl
+    self.oracle_ttl = oracle_ttl
+    self.markets = None
+    self.updated = 0
+    self.oracle_updated = 0
+    self.lock = asyncio.Lock()
+
+  # Fetch all perpetual markets (or one market)
+  async def fetch(self, market=None):
+    if market is None:
+      return await self.client.limiter.call("markets", self.client.indexer.markets.get_perpetual_markets)
+    return await self.client.limiter.call("markets", self.client.indexer.markets.get_perpetual_markets, market)
+
+  # Force a full refresh on next use
+  def invalidate(self):
+    self.markets = None
+    self.updated = 0
+    self.oracle_updated = 0
+
+  # Refresh metadata and oracle prices
+  async def refresh(self):
+    self.markets = await self.fetch()
+    self.updated = time.monotonic()
+    self.oracle_updated = self.updated
+
+  # Refresh oracle prices only, keeping cached metadata
+  async def refresh_oracle_prices(self):
+    response = await self.fetch()
+    for market, market_info in response["markets"].items():
+      if market in self.markets["markets"]:
+        self.markets["markets"][market]["oraclePrice"] = market_info["oraclePrice"]
+      else:
+        self.markets["markets"][market] = market_info
+    self.oracle_updated = time.monotonic()
+
+  # Get all markets in the same shape as get_perpetual_markets
+  # Oracle prices are refreshed when older than ORACLE_PRICE_TTL unless oracle_prices is False (metadata only)
+  async def get_markets(self, oracle_prices=True):
+    async with self.lock:
+      now = time.monotonic()
+      if self.markets is None or now - self.updated >= self.ttl:
+        await self.refresh()
+      elif oracle_prices and now - self.oracle_updated >= self.oracle_ttl:
+        await self.refresh_oracle_prices()
+      return self.markets
+
+  # Get metadata for a single market (tick size, step size, clobPairId etc), fetching only that market if it is not known yet
+  # Oracle prices on the result may be stale - use get_markets for prices
+  async def get_market(self, market):
+    markets = await self.get_markets(oracle_prices=False)
+    if market not in markets["markets"]:
+      async with self.lock:
+        response = await self.fetch(market)
+        self.markets["markets"].update(response["markets"])
+    return self.markets["markets"][market]
@@ -1,13 +1,21 @@
-import requests
+from constants import NOTIFY_QUEUE_SIZE, NOTIFY_COALESCE_SECONDS, NOTIFY_TIMEOUT_SECONDS, NOTIFY_FLUSH_SECONDS
 from decouple import config
+import requests
+import aiohttp
+import asyncio
 
-# Send Message
-def send_message(message):
+TELEGRAM_MAX_LENGTH = 4096
+
+notifier = None
+
+
+# Send Message (blocking - used when no event loop is running)
+def send_message_now(message):
     bot_token = config("TELEGRAM_TOKEN")
     chat_id = config("TELEGRAM_CHAT_ID")
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage?chat_id={chat_id}&text={message}"
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
     try:
-        res = requests.get(url)
+        res = requests.get(url, params={"chat_id": chat_id, "text": message}, timeout=NOTIFY_TIMEOUT_SECONDS)
         res.raise_for_status()  # Raise an HTTPError for bad responses
         if res.status_code == 200:
             return "sent"
@@ -17,3 +25,166 @@ def send_message(message):
     except requests.RequestException as e:
         print(f"Request failed: {e}")
         return "failed"
+
+
+# Class: Background Telegram notifier
+class Notifier:
+
+    """
+        Queues messages and sends them from a background task so trading never waits on Telegram
+        Messages arriving within NOTIFY_COALESCE_SECONDS are joined into one send
+        Code red alerts skip the wait and the bounded queue (when full, the oldest routine message is dropped)
+    """
+
+    def __init__(self, max_queue=NOTIFY_QUEUE_SIZE, coalesce_seconds=NOTIFY_COALESCE_SECONDS):
+        self.coalesce_seconds = coalesce_seconds
+        self.queue = asyncio.Queue(max_queue)
+        self.priority = asyncio.Queue()
+        self.wake = asyncio.Event()
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.loop = asyncio.get_running_loop()
+        self.session = None
+        self.task = None
+        self.dropped = 0
+
+    # Start worker
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    # Queue a message without waiting
+    def post(self, message):
+        message = str(message)
+        if "code red" in message.lower():
+            self.priority.put_nowait(message)
+        else:
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(message)
+        self.idle.clear()
+        self.wake.set()
+
+    # Take all queued messages from a lane
+    def drain(self, queue):
+        messages = []
+        while not queue.empty():
+            messages.append(queue.get_nowait())
+        return messages
+
+    # Split joined messages into Telegram sized chunks
+    def chunk(self, messages):
+        chunks = []
+        current = ""
+        for message in messages:
+            message = message[:TELEGRAM_MAX_LENGTH]
+            if current and len(current) + 1 + len(message) > TELEGRAM_MAX_LENGTH:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{message}" if current else message
+        if current:
+            chunks.append(current)
+        return chunks
+
+    # Send one message over the pooled session
+    async def send(self, message):
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=NOTIFY_TIMEOUT_SECONDS))
+        url = f"https://api.telegram.org/bot{config('TELEGRAM_TOKEN')}/sendMessage"
+        params = {"chat_id": config("TELEGRAM_CHAT_ID"), "text": message}
+        for attempt in range(2):
+            try:
+                async with self.session.get(url, params=params) as res:
+                    if res.status == 200:
+                        return "sent"
+
+                    # Rate limited - wait as asked and try once more
+                    if res.status == 429 and attempt == 0:
+                        response = await res.json()
+                        await asyncio.sleep(response.get("parameters", {}).get("retry_after", 1))
+                        continue
+                    print(f"Telegram API responded with status code {res.status}")
+                    return "failed"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"Request failed: {e}")
+                return "failed"
+        return "failed"
+
+    # Send queued messages until cancelled
+    async def run(self):
+        while True:
+            await self.wake.wait()
+            self.wake.clear()
+
+            # Routine messages wait briefly so bursts go out together (code red does not wait)
+            if self.priority.empty() and self.coalesce_seconds > 0:
+                try:
+                    await asyncio.wait_for(self.priority_arrived(), timeout=self.coalesce_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+            messages = self.drain(self.priority) + self.drain(self.queue)
+            if self.dropped > 0:
+                messages.append(f"({self.dropped} messages dropped)")
+                self.dropped = 0
+            for message in self.chunk(messages):
+                await self.send(message)
+
+            if self.priority.empty() and self.queue.empty():
+                self.idle.set()
+            else:
+                self.wake.set()
+
+    # Wait until a code red message is queued
+    async def priority_arrived(self):
+        while self.priority.empty():
+            self.wake.clear()
+            await self.wake.wait()
+
+    # Send anything still queued then stop
+    async def close(self, timeout=NOTIFY_FLUSH_SECONDS):
+        try:
+            await asyncio.wait_for(self.idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print("Unable to send all queued messages")
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.session is not None:
+            await self.session.close()
+
+
+# Get notifier for the running event loop (None if no loop is running)
+def get_notifier():
+    global notifier
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+    if notifier is None or notifier.loop is not loop:
+        notifier = Notifier()
+        notifier.start()
+    return notifier
+
+
+# Send Message
+# Queued for the background notifier when called inside the event loop, so callers never wait on Telegram
+def send_message(message):
+    active_notifier = get_notifier()
+    if active_notifier is None:
+        return send_message_now(message)
+    active_notifier.post(message)
+    return "queued"
+
+
+# Send queued messages before shutting down
+async def close_notifier(timeout=NOTIFY_FLUSH_SECONDS):
+    global notifier
+    if notifier is not None:
+        await notifier.close(timeout)
+        notifier = None
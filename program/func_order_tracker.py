@@ -0,0 +1,64 @@
+from constants import DYDX_ADDRESS, ORDER_RESOLVE_TIMEOUT, ORDER_FILL_TIMEOUT, ORDER_POLL_INITIAL_SECONDS, ORDER_POLL_MAX_SECONDS
+import asyncio
+import time
+
+
+# Class: Order tracker
+class OrderTracker:
+
+  """
+    Finds orders on the indexer as soon as they appear, polling with short exponential backoff
+    Used instead of fixed sleeps after placing orders and while waiting for fills
+  """
+
+  def __init__(self, client):
+    self.client = client
+    self.final_orders = {}
+
+  # Get order, served from cache once FILLED or CANCELED as those orders never change again
+  async def get_order(self, order_id):
+    if order_id in self.final_orders:
+      return self.final_orders[order_id]
+    order = await self.client.limiter.call("orders", self.client.indexer_account.account.get_order, order_id)
+    if order["status"] in ["FILLED", "CANCELED"]:
+      self.final_orders[order_id] = order
+    return order
+
+  # Sleep for the current backoff step without passing the deadline, returning the next step
+  async def backoff(self, delay, deadline):
+    await asyncio.sleep(max(min(delay, deadline - time.monotonic()), 0))
+    return min(delay * 2, ORDER_POLL_MAX_SECONDS)
+
+  # Resolve (clientId, clobPairId) to the indexer order, raising asyncio.TimeoutError if not seen in time
+  async def resolve(self, ticker, client_id, clob_pair_id, timeout=ORDER_RESOLVE_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    delay = ORDER_POLL_INITIAL_SECONDS
+    while True:
+      orders = await self.client.limiter.call(
+        "orders",
+        self.client.indexer_account.account.get_subaccount_orders,
+        DYDX_ADDRESS,
+        0,
+        ticker,
+        return_latest_orders = "true",
+      )
+      for order in orders:
+        if int(order["clientId"]) == client_id and int(order["clobPairId"]) == clob_pair_id:
+          return order
+      if time.monotonic() >= deadline:
+        raise asyncio.TimeoutError(f"Order {client_id} for {ticker} not found within {timeout} seconds")
+      delay = await self.backoff(delay, deadline)
+
+  # Wait until order reaches one of the statuses, returning the last status seen (also on timeout)
+  # Fills are applied to the account snapshot once the order is done
+  async def wait_for_status(self, order_id, statuses, timeout=ORDER_FILL_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    delay = ORDER_POLL_INITIAL_SECONDS
+    while True:
+      order = await self.get_order(order_id)
+      status = order["status"] if order["status"] else "FAILED"
+      if status in ["FILLED", "CANCELED"]:
+        await self.client.account.record_fill(order)
+      if status in statuses or time.monotonic() >= deadline:
+        return status
+      delay = await self.backoff(delay, deadline)
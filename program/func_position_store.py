@@ -0,0 +1,115 @@
+from constants import POSITION_STORE_PATH
+from datetime import datetime
+import sqlite3
+import json
+import os
+
+
+# Class: Local position store
+class PositionStore:
+
+  """
+    On-disk store of pairs opened by the bot, replacing full rewrites of bot_agents.json
+    SQLite in WAL mode, so each open or close is one small committed write that survives the process being killed
+    Open positions are indexed by market for constant time lookups
+  """
+
+  def __init__(self, path=POSITION_STORE_PATH, json_path="bot_agents.json"):
+    self.path = path
+    self.conn = sqlite3.connect(path)
+    self.conn.execute("PRAGMA journal_mode=WAL")
+    self.conn.execute("PRAGMA synchronous=NORMAL")
+    self.conn.execute("""
+      CREATE TABLE IF NOT EXISTS positions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        market_1 TEXT NOT NULL,
+        market_2 TEXT NOT NULL,
+        status TEXT NOT NULL,
+        data TEXT NOT NULL,
+        opened_at TEXT NOT NULL,
+        closed_at TEXT
+      )
+    """)
+    self.conn.execute("CREATE INDEX IF NOT EXISTS positions_open_market_1 ON positions (market_1) WHERE status = 'LIVE'")
+    self.conn.execute("CREATE INDEX IF NOT EXISTS positions_open_market_2 ON positions (market_2) WHERE status = 'LIVE'")
+    self.conn.commit()
+    self.migrate_json(json_path)
+
+  # Import positions from bot_agents.json once, then move the file aside
+  def migrate_json(self, json_path):
+    if json_path is None or not os.path.exists(json_path):
+      return
+    try:
+      with open(json_path) as f:
+        contents = f.read().strip()
+      positions = json.loads(contents) if contents else []
+    except Exception as e:
+      print(f"Unable to migrate {json_path} - {e}")
+      return
+    # Guard: Never import over positions already in the store
+    with self.conn:
+      if self.conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0] > 0:
+        print(f"Position store already has positions, ignoring {json_path}")
+        positions = []
+      for position in positions:
+        self.insert(position)
+    os.replace(json_path, f"{json_path}.migrated")
+    print(f"Migrated {len(positions)} positions from {json_path}")
+
+  # Insert position without committing
+  def insert(self, position):
+    position = {key: value for (key, value) in position.items() if key != "position_id"}
+    cursor = self.conn.execute(
+      "INSERT INTO positions (market_1, market_2, status, data, opened_at) VALUES (?, ?, 'LIVE', ?, ?)",
+      (position["market_1"], position["market_2"], json.dumps(position), datetime.now().isoformat())
+    )
+    return cursor.lastrowid
+
+  # Add a live position, returning its id
+  def add(self, position):
+    with self.conn:
+      return self.insert(position)
+
+  # Mark a position closed
+  def close(self, position_id):
+    with self.conn:
+      self.conn.execute(
+        "UPDATE positions SET status = 'CLOSED', closed_at = ? WHERE id = ? AND status = 'LIVE'",
+        (datetime.now().isoformat(), position_id)
+      )
+
+  # Mark every live position closed
+  def close_all(self):
+    with self.conn:
+      self.conn.execute("UPDATE positions SET status = 'CLOSED', closed_at = ? WHERE status = 'LIVE'", (datetime.now().isoformat(),))
+
+  # Get live positions in the order they were opened (each with its position_id)
+  def open_positions(self):
+    rows = self.conn.execute("SELECT id, data FROM positions WHERE status = 'LIVE' ORDER BY id").fetchall()
+    positions = []
+    for (position_id, data) in rows:
+      position = json.loads(data)
+      position["position_id"] = position_id
+      positions.append(position)
+    return positions
+
+  # Get ids of live positions (changes whenever a position opens or closes)
+  def open_ids(self):
+    return tuple(row[0] for row in self.conn.execute("SELECT id FROM positions WHERE status = 'LIVE' ORDER BY id"))
+
+  # Check if a market is part of a live position
+  def is_market_open(self, market):
+    row = self.conn.execute(
+      "SELECT 1 FROM positions WHERE status = 'LIVE' AND market_1 = ? UNION ALL SELECT 1 FROM positions WHERE status = 'LIVE' AND market_2 = ? LIMIT 1",
+      (market, market)
+    ).fetchone()
+    return row is not None
+
+  # Get markets in live positions
+  def markets(self):
+    rows = self.conn.execute("SELECT market_1 FROM positions WHERE status = 'LIVE' UNION SELECT market_2 FROM positions WHERE status = 'LIVE'").fetchall()
+    return sorted(row[0] for row in rows)
+
+  # Close connection
+  def close_connection(self):
+    self.conn.close()
@@ -5,22 +5,21 @@ from constants import DYDX_ADDRESS
 from func_utils import format_number
 from func_public import get_markets
 import random
-import time
-import json
+import asyncio
 from datetime import datetime
 
-from pprint import pprint
 
 # Cancel Order
 async def cancel_order(client, order_id):
   order = await get_order(client, order_id)
-  market = Market((await client.indexer.markets.get_perpetual_markets(order["ticker"]))["markets"][order["ticker"]])
+  market = Market(await client.market_cache.get_market(order["ticker"]))
   market_order_id = market.order_id(DYDX_ADDRESS, 0, random.randint(0, MAX_CLIENT_ID), OrderFlags.SHORT_TERM)
   market_order_id.client_id = int(order["clientId"])
   market_order_id.clob_pair_id = int(order["clobPairId"])
-  current_block = await client.node.latest_block_height()
-  good_til_block = current_block + 1 + 10
-  cancel = await client.node.cancel_order(
+  good_til_block = await client.blocks.good_til_block(1 + 10)
+  cancel = await client.limiter.call(
+    "transactions",
+    client.node.cancel_order,
     client.wallet,
     market_order_id,
     good_til_block=good_til_block
@@ -28,66 +27,57 @@ async def cancel_order(client, order_id):
   print(cancel)
   print(f"Attempted to cancel order for: {order["ticker"]}. Please check dashboard to ensure cancelled.")
 
-# Get Account
+# Get Account (refreshes the account snapshot)
 async def get_account(client):
-  account = await client.indexer_account.account.get_subaccount(DYDX_ADDRESS, 0)
-  return account["subaccount"]
+  return await client.account.refresh()
 
 
-# Get Open Positions
+# Get Open Positions (refreshes the account snapshot)
 async def get_open_positions(client):
-  response = await client.indexer_account.account.get_subaccount(DYDX_ADDRESS, 0)
-  return response["subaccount"]["openPerpetualPositions"]
+  await client.account.refresh()
+  return client.account.positions
 
 
 # Get Existing Order
 async def get_order(client, order_id):
-  return await client.indexer_account.account.get_order(order_id)
+  return await client.order_tracker.get_order(order_id)
 
 
-# Get existing open positions
-async def is_open_positions(client, market):
-
-  # Protect API
-  time.sleep(0.2)
+# Get Existing Orders concurrently (returned in the same order as order_ids)
+async def get_orders(client, order_ids):
+  return await asyncio.gather(*[get_order(client, order_id) for order_id in order_ids])
 
-  # Get positions
-  response = await client.indexer_account.account.get_subaccount(DYDX_ADDRESS, 0)
-  open_positions = response["subaccount"]["openPerpetualPositions"]
 
-  # Determine if open
-  if len(open_positions) > 0:
-    for token in open_positions.keys():
-      if token == market:
-        return True
-  
-  # Return False
-  return False
+# Get existing open positions (from the account snapshot)
+async def is_open_positions(client, market):
+  await client.account.ensure()
+  return client.account.is_open(market)
 
 
 # Check order status
 async def check_order_status(client, order_id):
-  order = await client.indexer_account.account.get_order(order_id)
+  order = await get_order(client, order_id)
   if order["status"]:
     return order["status"]
   return "FAILED"
 
 
 # Place market order
-async def place_market_order(client, market, side, size, price, reduce_only=False):
+async def place_market_order(client, market, side, size, price, reduce_only=False, on_sent=None):
 
   # Initialize
   ticker = market
-  current_block = await client.node.latest_block_height()
-  market = Market((await client.indexer.markets.get_perpetual_markets(market))["markets"][market])
+  good_til_block = await client.blocks.good_til_block(10)
+  market = Market(await client.market_cache.get_market(market))
   market_order_id = market.order_id(DYDX_ADDRESS, 0, random.randint(0, MAX_CLIENT_ID), OrderFlags.SHORT_TERM)
-  good_til_block = current_block + 10
 
   # Set Time In Force
   time_in_force = Order.TimeInForce.TIME_IN_FORCE_UNSPECIFIED
 
   # Place Market Order
-  order = await client.node.place_order(
+  order = await client.limiter.call(
+    "transactions",
+    client.node.place_order,
     client.wallet,
     market.order(
       market_order_id,
@@ -97,34 +87,19 @@ async def place_market_order(client, market, side, size, price, reduce_only=Fals
       price= float(price),  # Set to 0 for market orders
       time_in_force = time_in_force,
       reduce_only = False,
-      good_til_block = current_block + 10,
+      good_til_block = good_til_block,
     ),
   )
+  if on_sent is not None:
+    on_sent()
 
-  # Get Recent Orders
+  # Get order id as soon as the order appears in recent orders
   # We do this as in the current V4 version at the time of developing this, the order response does not return the order number
-  time.sleep(5)
-  orders = await client.indexer_account.account.get_subaccount_orders(
-    DYDX_ADDRESS, 
-    0, 
-    ticker, 
-    return_latest_orders = "true",
-  )
-
-  # Get latest order id
-  order_id = ""
-  for order in orders:
-    client_id = int(order["clientId"])
-    clob_pair_id = int(order["clobPairId"])
-    order["createdAtHeight"] = int(order["createdAtHeight"])
-    if client_id == market_order_id.client_id and clob_pair_id == market_order_id.clob_pair_id:
-      order_id = order["id"]
-      break
-
-  # Ensure latest order
-  if order_id == "":
-    sorted_orders = sorted(orders, key=lambda x: x["createdAtHeight"], reverse=True)
-    pprint("last order:", sorted_orders[0])
+  try:
+    order = await client.order_tracker.resolve(ticker, market_order_id.client_id, market_order_id.clob_pair_id)
+    order_id = order["id"]
+  except asyncio.TimeoutError as e:
+    print(e)
     print("Warning: Unable to detect latest order. Please check dashboard")
     exit(1)
 
@@ -137,7 +112,7 @@ async def place_market_order(client, market, side, size, price, reduce_only=Fals
 
 # Get Open Orders
 async def cancel_all_orders(client):
-  orders = await client.indexer_account.account.get_subaccount_orders(DYDX_ADDRESS, 0, status = "OPEN")
+  orders = await client.limiter.call("orders", client.indexer_account.account.get_subaccount_orders, DYDX_ADDRESS, 0, status = "OPEN")
   if len(orders) > 0:
     for order in orders:
       await cancel_order(client, order["id"])
@@ -151,15 +126,9 @@ async def abort_all_positions(client):
   # Cancel all orders
   await cancel_all_orders(client)
 
-  # Protect API
-  time.sleep(0.5)
-
   # Get markets for reference of tick size
   markets = await get_markets(client)
 
-  # Protect API
-  time.sleep(0.5)
-
   # Get all open positions
   positions = await get_open_positions(client)
 
@@ -200,13 +169,8 @@ async def abort_all_positions(client):
       # Append the result
       close_orders.append(order)
 
-      # Protect API
-      time.sleep(0.2)
-
-    # Override json file with empty list
-    bot_agents = []
-    with open("bot_agents.json", "w") as f:
-      json.dump(bot_agents, f)
+    # Mark all saved positions closed
+    client.position_store.close_all()
 
     # Return closed orders
     return close_orders
\ No newline at end of file
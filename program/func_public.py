@@ -1,81 +1,151 @@
-from constants import RESOLUTION
-from func_utils import get_ISO_times
+from constants import RESOLUTION, HISTORY_CANDLES, CANDLE_STORE_CANDLES, CANDLE_FETCH_CONCURRENCY, CANDLE_REQUEST_TIMEOUT, CANDLE_REQUEST_RETRIES
+from func_utils import RESOLUTION_SECONDS, iso_to_epoch, epoch_to_iso, candle_start
 import pandas as pd
 import numpy as np
+import asyncio
 import time
 
 from pprint import pprint
 
-# Get relevant time periods for ISO from and to
-ISO_TIMES = get_ISO_times()
+# Max candles returned per DYDX candles request
+CANDLES_PER_REQUEST = 100
+
+# Fetch Candles
+# Single candles request with a timeout, retried by the rate limiter on 429 and on timeouts, connection and server errors
+async def fetch_candles(client, market, **kwargs):
+  async def request():
+    return await asyncio.wait_for(
+      client.indexer.markets.get_perpetual_market_candles(
+        market = market,
+        resolution = RESOLUTION,
+        **kwargs
+      ),
+      timeout = CANDLE_REQUEST_TIMEOUT
+    )
 
-# Get Recent Candles
-async def get_candles_recent(client, market):
+  return await client.limiter.call("candles", request, transient_retries = CANDLE_REQUEST_RETRIES)
 
-  # Define output
-  close_prices = []
 
-  # Protect API
-  time.sleep(0.2)
+# Get Recent Candles
+# Served from the market data stream when connected, else the recent candles cache (one download per market per candle)
+async def get_candles_recent(client, market):
+  if client.market_stream is not None and client.market_stream.is_ready(market):
+    return client.market_stream.get_closes(market)
+  return await client.candle_cache.get_closes(market)
 
-  # Get Prices from DYDX V4
-  response = await client.indexer.markets.get_perpetual_market_candles(
-    market = market, 
-    resolution = RESOLUTION
-  )
 
-  # Candles
-  candles = response
+# Get Recent Candles for many markets concurrently as {market: closes}
+async def get_candles_recent_batch(client, markets):
+  markets = list(dict.fromkeys(markets))
+  closes = await asyncio.gather(*[get_candles_recent(client, market) for market in markets])
+  return dict(zip(markets, closes))
 
-  # Structure data
-  for candle in candles["candles"]:
-    close_prices.append(candle["close"])
 
-  # Construct and return close price series
-  close_prices.reverse()
-  prices_result = np.array(close_prices).astype(np.float64)
-  return prices_result
+# Get start time (epoch seconds) of the latest candle returned by get_candles_recent
+def get_last_candle_start(client, market):
+  if client.market_stream is not None and client.market_stream.is_ready(market):
+    return client.market_stream.last_started_at(market)
+  return client.candle_cache.last_started_at(market)
 
 
 # Get Historical Candles
-async def get_candles_historical(client, market):
-
-  # Define output
-  close_prices = []
-
-  # Extract historical price data for each timeframe
-  for timeframe in ISO_TIMES.keys():
-
-    # Confirm times needed
-    tf_obj = ISO_TIMES[timeframe]
-    from_iso = tf_obj["from_iso"] + ".000Z"
-    to_iso = tf_obj["to_iso"] + ".000Z"
-
-    # Protect rate limits
-    time.sleep(0.2)
-
-    response = await client.indexer.markets.get_perpetual_market_candles(
-      market = market, 
-      resolution = RESOLUTION, 
-      from_iso = from_iso,
-      to_iso = to_iso,
-      limit = 100
-    )
-
-    candles = response
-
-    # Structure data
+# Reads the local candle store first and only requests candles newer than the last one stored
+# All timeframes are requested at once, limited by the semaphore if provided
+async def get_candles_historical(client, market, semaphore=None):
+
+  # Limit requests in flight
+  if semaphore is None:
+    semaphore = asyncio.Semaphore(CANDLE_FETCH_CONCURRENCY)
+
+  # Determine window (computed per call so long running processes move forward)
+  resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+  current_start = candle_start(time.time(), RESOLUTION)
+  window_start = current_start - (HISTORY_CANDLES - 1) * resolution_seconds
+  keep_from = current_start - (max(CANDLE_STORE_CANDLES, HISTORY_CANDLES) - 1) * resolution_seconds
+
+  # Fetch from the last stored candle (refreshed as it may have been incomplete when stored)
+  # plus any older part of the window not fetched before (when HISTORY_CANDLES was raised)
+  last_started_at = client.candle_store.last_started_at(market, RESOLUTION)
+  covered_from = client.candle_store.covered_from(market, RESOLUTION)
+  if last_started_at is None or covered_from is None or last_started_at < window_start:
+    ranges = [(window_start, current_start)]
+    covered_from = window_start
+  else:
+    ranges = [(last_started_at, current_start)]
+    if covered_from > window_start:
+      ranges.append((window_start, covered_from - resolution_seconds))
+      covered_from = window_start
+
+  # Extract historical price data for a single timeframe
+  async def fetch_timeframe(from_ts, range_end):
+    to_ts = min(from_ts + (CANDLES_PER_REQUEST - 1) * resolution_seconds, range_end)
+    async with semaphore:
+      return await fetch_candles(
+        client,
+        market,
+        from_iso = epoch_to_iso(from_ts),
+        to_iso = epoch_to_iso(to_ts),
+        limit = CANDLES_PER_REQUEST
+      )
+
+  # Extract missing price data for each timeframe
+  timeframes = [(from_ts, range_end) for (range_start, range_end) in ranges for from_ts in range(range_start, range_end + 1, CANDLES_PER_REQUEST * resolution_seconds)]
+  responses = await asyncio.gather(*[fetch_timeframe(from_ts, range_end) for (from_ts, range_end) in timeframes])
+
+  # Store new candles and drop those older than the store keeps
+  rows = []
+  for candles in responses:
     for candle in candles["candles"]:
-      close_prices.append({"datetime": candle["startedAt"], market: candle["close"] })
+      rows.append((iso_to_epoch(candle["startedAt"]), float(candle["close"])))
+  client.candle_store.save(market, RESOLUTION, rows)
+  client.candle_store.set_covered_from(market, RESOLUTION, max(covered_from, keep_from))
+  client.candle_store.prune(market, RESOLUTION, keep_from)
 
-  # Construct and return DataFrame
-  close_prices.reverse()
-  return close_prices
+  # Return candle start times and close prices (oldest first)
+  return client.candle_store.load_arrays(market, RESOLUTION, window_start)
 
 
 # Get Markets
+# Served from the market metadata cache shared through the client
 async def get_markets(client):
-  return await client.indexer.markets.get_perpetual_markets()
+  return await client.market_cache.get_markets()
+
+
+# Build price matrix
+def build_price_matrix(market_candles):
+
+  """
+    Align close prices for each market on an integer candle index in a single pass
+    market_candles maps market to (started_at, close) arrays
+    Returns candle start times, markets and a float64 matrix (candles x markets) with NaN where missing
+  """
+
+  # Guard: No prices
+  markets = list(market_candles.keys())
+  if len(markets) == 0:
+    return np.empty(0, dtype=np.int64), markets, np.empty((0, 0))
+
+  # Determine candle index range
+  resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+  first_start = min(int(started_at[0]) for (started_at, _) in market_candles.values() if len(started_at) > 0)
+  last_start = max(int(started_at[-1]) for (started_at, _) in market_candles.values() if len(started_at) > 0)
+  n_candles = (last_start - first_start) // resolution_seconds + 1
+
+  # Fill preallocated matrix column by column
+  matrix = np.full((n_candles, len(markets)), np.nan)
+  for i, market in enumerate(markets):
+    (started_at, closes) = market_candles[market]
+    matrix[(started_at - first_start) // resolution_seconds, i] = closes
+
+  # Keep candles where at least one market has a price (as an outer join would)
+  index = first_start + np.arange(n_candles, dtype=np.int64) * resolution_seconds
+  has_price = ~np.isnan(matrix).all(axis=1)
+  if not has_price.all():
+    index = index[has_price]
+    matrix = matrix[has_price]
+
+  # Return result
+  return index, markets, matrix
 
 
 # Construct market prices
@@ -93,31 +163,41 @@ async def construct_market_prices(client):
     if market_info["status"] == "ACTIVE":
       tradeable_markets.append(market)
 
-  # Set initial DateFrame
-  close_prices = await get_candles_historical(client, tradeable_markets[0])
-  df = pd.DataFrame(close_prices)
-  df.set_index("datetime", inplace=True)
-
-  # Append other prices to DataFrame
-  # You can limit the amount to loop though here to save time in development
-  for (i, market) in enumerate(tradeable_markets[0:]):
-    print(f"Extracting prices for {i + 1} of {len(tradeable_markets)} tokens for {market}")
-    close_prices_add = await get_candles_historical(client, market)
-    df_add = pd.DataFrame(close_prices_add)
-    try:
-      df_add.set_index("datetime", inplace=True)
-      df = pd.merge(df, df_add, how="outer", on="datetime", copy=False)
-      # print(df.head())
-    except Exception as e: 
-      print(f"Failed to add {market} - {e}")
-    del df_add
+  # Extract prices for all markets concurrently
+  # CANDLE_FETCH_CONCURRENCY caps the number of candle requests in flight across all markets
+  print(f"Extracting prices for {len(tradeable_markets)} tokens...")
+  start_time = time.perf_counter()
+  semaphore = asyncio.Semaphore(CANDLE_FETCH_CONCURRENCY)
+  results = await asyncio.gather(
+    *[get_candles_historical(client, market, semaphore) for market in tradeable_markets],
+    return_exceptions = True
+  )
+  print(f"Extracted prices in {time.perf_counter() - start_time:.1f} seconds")
+
+  # Collect prices per market
+  market_candles = {}
+  for market, candles in zip(tradeable_markets, results):
+    if isinstance(candles, Exception):
+      print(f"Failed to add {market} - {candles}")
+      continue
+    if len(candles[0]) == 0:
+      print(f"Failed to add {market} - no candles returned")
+      continue
+    market_candles[market] = candles
+
+  # Align prices into a single matrix
+  index, markets, matrix = build_price_matrix(market_candles)
 
   # Check any columns with NaNs
-  nans = df.columns[df.isna().any()].tolist()
+  complete = ~np.isnan(matrix).any(axis=0)
+  nans = [market for (market, is_complete) in zip(markets, complete) if not is_complete]
   if len(nans) > 0:
     print("Dropping columns: ")
     print(nans)
-    df.drop(columns=nans, inplace=True)
+    matrix = matrix[:, complete]
+    markets = [market for (market, is_complete) in zip(markets, complete) if is_complete]
 
-  # Return result
-  return df
\ No newline at end of file
+  # Construct and return DataFrame
+  df = pd.DataFrame(matrix, columns=markets, index=[epoch_to_iso(started_at) for started_at in index])
+  df.index.name = "datetime"
+  return df
@@ -0,0 +1,123 @@
+from constants import RATE_LIMITS, RATE_LIMIT_RETRIES, RATE_LIMIT_BACKOFF
+import asyncio
+import httpx
+import grpc
+import time
+
+
+# Get HTTP status code from an indexer error (None if it is not an HTTP response error)
+def get_status_code(e):
+  try:
+    return int(e.response.status_code)
+  except Exception:
+    return None
+
+
+# Check if an exception is a rate limit response (indexer HTTP 429 or node gRPC RESOURCE_EXHAUSTED)
+def is_rate_limited(e):
+  if get_status_code(e) == 429:
+    return True
+  return isinstance(e, grpc.aio.AioRpcError) and e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED
+
+
+# Check if an exception is a transient failure worth retrying (timeout, connection error or server error)
+def is_transient(e):
+  status_code = get_status_code(e)
+  if status_code is not None:
+    return status_code >= 500
+  return isinstance(e, (asyncio.TimeoutError, ConnectionError, httpx.TransportError))
+
+
+# Get Retry-After seconds from an HTTP error if the server sent one
+def get_retry_after(e):
+  try:
+    return float(e.response.headers["Retry-After"])
+  except Exception:
+    return None
+
+
+# Class: Token bucket for a single endpoint
+class TokenBucket:
+
+  """
+    Refills at rate tokens per second up to capacity (burst)
+    Waiting callers sleep on the event loop instead of blocking it
+  """
+
+  def __init__(self, rate, capacity):
+    self.rate = rate
+    self.capacity = capacity
+    self.tokens = capacity
+    self.updated = time.monotonic()
+    self.blocked_until = 0
+    self.lock = asyncio.Lock()
+
+  # Refill tokens for time elapsed
+  def refill(self):
+    now = time.monotonic()
+    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+    self.updated = now
+    return now
+
+  # Wait for and take one token
+  async def acquire(self):
+    async with self.lock:
+      while True:
+        now = self.refill()
+
+        # Guard: Respect backoff after a rate limit response
+        if now < self.blocked_until:
+          await asyncio.sleep(self.blocked_until - now)
+          continue
+
+        # Take token if available
+        if self.tokens >= 1:
+          self.tokens -= 1
+          return
+
+        # Sleep until next token is due
+        await asyncio.sleep((1 - self.tokens) / self.rate)
+
+  # Pause the bucket after a rate limit response
+  def backoff(self, seconds):
+    self.refill()
+    self.tokens = 0
+    self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+# Class: Rate limiter shared by all indexer and node calls
+class RateLimiter:
+
+  """
+    Holds one token bucket per endpoint group (see RATE_LIMITS in constants)
+    Retries calls rejected with 429 after backing off the bucket, and transient failures if asked to
+    This is the only retry layer, so callers should not wrap it in retries of their own
+  """
+
+  def __init__(self, limits=RATE_LIMITS):
+    self.buckets = {}
+    for name, (rate, capacity) in limits.items():
+      self.buckets[name] = TokenBucket(rate, capacity)
+
+  # Call an API function through the given bucket
+  # Up to RATE_LIMIT_RETRIES retries on 429 and transient_retries on transient failures, sharing one attempt count
+  async def call(self, bucket_name, func, *args, transient_retries=0, **kwargs):
+    bucket = self.buckets[bucket_name]
+    for attempt in range(max(RATE_LIMIT_RETRIES, transient_retries) + 1):
+      await bucket.acquire()
+      try:
+        return await func(*args, **kwargs)
+      except Exception as e:
+
+        # Back off the whole bucket so other callers wait too
+        if is_rate_limited(e) and attempt < RATE_LIMIT_RETRIES:
+          delay = get_retry_after(e) or RATE_LIMIT_BACKOFF * 2 ** attempt
+          print(f"Rate limited on {bucket_name}, backing off {delay:.1f} seconds")
+          bucket.backoff(delay)
+
+        # Back off this call only
+        elif is_transient(e) and attempt < transient_retries:
+          print(f"Request failed on {bucket_name} (attempt {attempt + 1}) - {e}")
+          await asyncio.sleep(0.5 * 2 ** attempt)
+        else:
+          raise
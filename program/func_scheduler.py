@@ -0,0 +1,116 @@
+from constants import RESOLUTION, SCHEDULER_INTERVAL_SECONDS, CANDLE_OPEN_REFRESH_SECONDS
+from func_utils import candle_start
+from func_stream import get_tracked_markets
+import hashlib
+import asyncio
+import time
+
+
+# Get hash of a file's contents (None if missing)
+# Contents rather than modified time, as the pairs file can be rewritten with the same pairs
+def file_hash(path):
+  try:
+    with open(path, "rb") as f:
+      return hashlib.md5(f.read()).hexdigest()
+  except OSError:
+    return None
+
+
+# Fingerprint of the inputs to the exit and entry jobs
+# Unchanged fingerprint means a job would see the same prices and positions as last run
+def cycle_fingerprint(client):
+  now = time.time()
+  files = (file_hash("cointegrated_pairs.csv"), client.position_store.open_ids())
+
+  # Streaming - latest candle and close of every tracked market
+  stream = client.market_stream
+  if stream is not None and stream.is_fresh():
+    prices = []
+    for market in get_tracked_markets(client):
+      if stream.is_ready(market):
+        prices.append((market, stream.last_started_at(market), float(stream.get_closes(market)[-1])))
+    return (files, tuple(prices))
+
+  # Polling - prices can only change at a candle boundary or when the open candle is due a refresh
+  refresh_period = None
+  if CANDLE_OPEN_REFRESH_SECONDS is not None:
+    refresh_period = int(now // CANDLE_OPEN_REFRESH_SECONDS)
+  return (files, candle_start(now, RESOLUTION), refresh_period)
+
+
+# Class: Scheduled job
+class ScheduledJob:
+
+  def __init__(self, name, func, deadline, fingerprint=None):
+    self.name = name
+    self.func = func
+    self.deadline = deadline
+    self.fingerprint = fingerprint
+    self.last_fingerprint = None
+    self.runs = 0
+    self.skips = 0
+
+
+# Class: Candle-close driven scheduler
+class Scheduler:
+
+  """
+    Wakes on a candle close from the market data stream or every SCHEDULER_INTERVAL_SECONDS
+    Runs jobs in order, skipping any whose input fingerprint has not changed since it last ran
+    A job which cannot start within its deadline after the wake-up is skipped until the next wake-up
+    Running jobs are never cancelled, as that could leave a pair half opened or closed
+  """
+
+  def __init__(self, client, interval=SCHEDULER_INTERVAL_SECONDS):
+    self.client = client
+    self.interval = interval
+    self.jobs = []
+
+  # Add job (func is awaited with the client)
+  def add_job(self, name, func, deadline, fingerprint=None):
+    self.jobs.append(ScheduledJob(name, func, deadline, fingerprint))
+
+  # Wait for next candle close or timer
+  async def wait_for_wake(self):
+    stream = self.client.market_stream
+    if stream is None:
+      await asyncio.sleep(self.interval)
+      return
+    try:
+      await asyncio.wait_for(stream.candle_closed.wait(), timeout=self.interval)
+    except asyncio.TimeoutError:
+      pass
+    stream.candle_closed.clear()
+
+  # Run jobs once
+  async def run_once(self):
+    woke_at = time.monotonic()
+    for job in self.jobs:
+
+      # Guard: Skip if inputs unchanged
+      if job.fingerprint is not None and job.runs > 0 and job.fingerprint(self.client) == job.last_fingerprint:
+        job.skips += 1
+        continue
+
+      # Guard: Skip if too late to start
+      if time.monotonic() - woke_at > job.deadline:
+        print(f"Scheduler: {job.name} missed its deadline, waiting for next wake-up")
+        continue
+
+      # Run job
+      start_time = time.monotonic()
+      await job.func(self.client)
+      job.runs += 1
+      run_time = time.monotonic() - start_time
+      if run_time > job.deadline:
+        print(f"Scheduler: {job.name} took {run_time:.1f}s (deadline {job.deadline}s)")
+
+      # Record inputs after running so the job's own changes do not trigger it again
+      if job.fingerprint is not None:
+        job.last_fingerprint = job.fingerprint(self.client)
+
+  # Run forever
+  async def run(self):
+    while True:
+      await self.run_once()
+      await self.wait_for_wake()
@@ -0,0 +1,60 @@
+from constants import WINDOW, ZSCORE_THRESH
+from func_cointegration import calculate_zscore_last
+from func_public import get_candles_recent
+import numpy as np
+import asyncio
+
+
+# Get index arrays into a list of distinct markets for each pair's base and quote market
+def build_pair_index(base_markets, quote_markets):
+  markets = list(dict.fromkeys(list(base_markets) + list(quote_markets)))
+  position = {market: i for (i, market) in enumerate(markets)}
+  base_index = np.array([position[market] for market in base_markets], dtype=np.intp)
+  quote_index = np.array([position[market] for market in quote_markets], dtype=np.intp)
+  return markets, base_index, quote_index
+
+
+# Build matrix of the latest closes (rows oldest first, one column per market)
+# Markets with fewer than window closes (or failed requests) are left as NaN
+def build_recent_matrix(candles, markets, window=WINDOW):
+  matrix = np.full((window, len(markets)), np.nan)
+  for (i, market) in enumerate(markets):
+    closes = candles.get(market)
+    if closes is None or isinstance(closes, BaseException) or len(closes) < window:
+      continue
+    matrix[:, i] = np.asarray(closes, dtype=np.float64)[-window:]
+  return matrix
+
+
+# Get recent closes for all markets concurrently as a matrix
+async def get_recent_matrix(client, markets, window=WINDOW):
+  results = await asyncio.gather(*[get_candles_recent(client, market) for market in markets], return_exceptions=True)
+  for (market, result) in zip(markets, results):
+    if isinstance(result, BaseException):
+      print(f"Unable to get prices for {market} - {result}")
+  return build_recent_matrix(dict(zip(markets, results)), markets, window)
+
+
+# Z-scores of every pair spread in one pass (NaN where prices are missing)
+def pair_zscores(matrix, base_index, quote_index, hedge_ratios, window=WINDOW):
+  spreads = matrix[:, base_index] - np.asarray(hedge_ratios, dtype=np.float64) * matrix[:, quote_index]
+  return calculate_zscore_last(spreads, window)
+
+
+# Scan pairs for entry triggers
+# Returns triggered pairs ranked by absolute z-score, with latest prices for the executor
+async def scan_pairs(client, pairs, threshold=ZSCORE_THRESH):
+  (markets, base_index, quote_index) = build_pair_index(pairs["base_market"], pairs["quote_market"])
+  matrix = await get_recent_matrix(client, markets)
+  z_scores = pair_zscores(matrix, base_index, quote_index, pairs["hedge_ratio"].to_numpy())
+
+  # Rank triggered pairs (NaN never triggers)
+  with np.errstate(invalid="ignore"):
+    triggered = np.flatnonzero(np.abs(z_scores) >= threshold)
+  ranked = triggered[np.argsort(-np.abs(z_scores[triggered]), kind="stable")]
+
+  signals = pairs.iloc[ranked].reset_index(drop=True)
+  signals["z_score"] = z_scores[ranked]
+  signals["base_price"] = matrix[-1, base_index[ranked]]
+  signals["quote_price"] = matrix[-1, quote_index[ranked]]
+  return signals
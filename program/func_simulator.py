@@ -0,0 +1,460 @@
+from constants import RESOLUTION, DYDX_ADDRESS, HISTORY_CANDLES
+from constants import SIM_MARKETS, SIM_LATENCY_SECONDS, SIM_LATENCY_SIGMA, SIM_RATE_LIMIT_PROBABILITY, SIM_PARTIAL_FILL_PROBABILITY
+from constants import SIM_INDEXER_LAG_SECONDS, SIM_FILL_SECONDS, SIM_BLOCK_SECONDS, SIM_COLLATERAL, SIM_SEED
+from func_utils import RESOLUTION_SECONDS, iso_to_epoch, epoch_to_iso, candle_start
+from func_candle_store import CandleStore
+from func_position_store import PositionStore
+from func_stream_local import LocalIndexerSocket
+from func_messaging import Notifier
+import func_messaging
+import pandas as pd
+import numpy as np
+import asyncio
+import math
+import time
+import uuid
+
+
+# Percentile of a list of values (NaN when empty)
+def percentile(values, q):
+  return float(np.percentile(values, q)) if len(values) > 0 else float("nan")
+
+
+# Class: Rate limit response from the simulated exchange
+class SimulatedRateLimitError(Exception):
+
+  def __init__(self, retry_after=1):
+    super().__init__("429 Too Many Requests (simulated)")
+    self.response = type("Response", (), {"status_code": 429, "headers": {"Retry-After": str(retry_after)}})()
+
+
+# Class: Notifier that records messages instead of sending them to Telegram
+class RecordingNotifier(Notifier):
+
+  def __init__(self):
+    super().__init__()
+    self.messages = []
+
+  def start(self):
+    pass
+
+  def post(self, message):
+    self.messages.append(str(message))
+
+  async def close(self, timeout=None):
+    pass
+
+
+# Class: Simulated dYdX indexer and node
+class SimulatedExchange:
+
+  """
+    Serves markets, candles, subaccount, orders and blocks from synthetic (or recorded) candles
+    Every call waits a lognormal latency and can fail with a 429, per endpoint if configured
+    Orders reach the indexer after SIM_INDEXER_LAG_SECONDS and fill SIM_FILL_SECONDS after placement when marketable
+    Some fills only partly complete, and the short-term order then expires as CANCELED
+  """
+
+  def __init__(
+    self,
+    candles=None,
+    n_markets=SIM_MARKETS,
+    n_candles=HISTORY_CANDLES,
+    latency=SIM_LATENCY_SECONDS,
+    latency_sigma=SIM_LATENCY_SIGMA,
+    rate_limit_probability=SIM_RATE_LIMIT_PROBABILITY,
+    partial_fill_probability=SIM_PARTIAL_FILL_PROBABILITY,
+    indexer_lag=SIM_INDEXER_LAG_SECONDS,
+    fill_seconds=SIM_FILL_SECONDS,
+    block_seconds=SIM_BLOCK_SECONDS,
+    collateral=SIM_COLLATERAL,
+    seed=SIM_SEED,
+  ):
+    self.rng = np.random.default_rng(seed)
+    self.latency = latency
+    self.latency_sigma = latency_sigma
+    self.rate_limit_probability = rate_limit_probability
+    self.partial_fill_probability = partial_fill_probability
+    self.indexer_lag = indexer_lag
+    self.fill_seconds = fill_seconds
+    self.block_seconds = block_seconds
+    self.resolution_seconds = RESOLUTION_SECONDS[RESOLUTION]
+    self.started = time.monotonic()
+    self.candles = candles if candles is not None else self.synthetic_candles(n_markets, n_candles)
+    self.markets = {market: self.market_info(market, i) for (i, market) in enumerate(self.candles.keys())}
+    self.clob_pairs = {int(info["clobPairId"]): market for (market, info) in self.markets.items()}
+    self.collateral = float(collateral)
+    self.positions = {}
+    self.orders = {}
+    self.fills = []
+    self.processed_height = 0
+    self.stats = {}
+
+    # Interfaces in the shape of the dydx_v4_client objects used through the Client
+    self.indexer = type("Indexer", (), {"markets": SimulatedMarkets(self), "account": SimulatedAccount(self)})()
+    self.node = SimulatedNode(self)
+
+  # Synthetic candles ending at the current candle - half the markets follow shared factors so some pairs cointegrate
+  def synthetic_candles(self, n_markets, n_candles):
+    last_start = candle_start(time.time(), RESOLUTION)
+    started_at = last_start - np.arange(n_candles)[::-1] * self.resolution_seconds
+    n_factors = max(1, n_markets // 4)
+    factors = np.cumsum(self.rng.normal(0, 1, (n_candles, n_factors)), axis=0) + 100
+    candles = {}
+    for market_number in range(n_markets):
+      if market_number % 2 == 0:
+        noise = np.zeros(n_candles)
+        phi = self.rng.uniform(0.3, 0.9)
+        for t in range(1, n_candles):
+          noise[t] = phi * noise[t - 1] + self.rng.normal(0, 1)
+        closes = self.rng.uniform(0.5, 2) * factors[:, market_number % n_factors] + noise + 50
+      else:
+        closes = np.cumsum(self.rng.normal(0, 1, n_candles)) + 200
+      candles[f"SIM{market_number}-USD"] = (started_at, np.maximum(closes, 1.0))
+    return candles
+
+  # Load recorded candles from the candle store
+  @staticmethod
+  def recorded_candles(store=None, resolution=RESOLUTION):
+    store = store if store is not None else CandleStore()
+    candles = {}
+    for market in store.markets(resolution):
+      (started_at, closes) = store.load_arrays(market, resolution)
+      if len(started_at) > 0:
+        candles[market] = (started_at, closes)
+    return candles
+
+  # Market metadata in the indexer format (tick and step sizes scaled to the price)
+  def market_info(self, market, clob_pair_id):
+    price = float(self.candles[market][1][-1])
+    tick_exponent = math.floor(math.log10(price)) - 3
+    step_exponent = -math.floor(math.log10(price)) - 1
+    atomic_resolution = step_exponent - 3
+    return {
+      "ticker": market,
+      "status": "ACTIVE",
+      "clobPairId": str(clob_pair_id),
+      "oraclePrice": str(price),
+      "tickSize": f"{10.0 ** tick_exponent:.{max(-tick_exponent, 0)}f}",
+      "stepSize": f"{10.0 ** step_exponent:.{max(-step_exponent, 0)}f}",
+      "atomicResolution": atomic_resolution,
+      "quantumConversionExponent": -9,
+      "stepBaseQuantums": 1000,
+      "subticksPerTick": 10 ** (tick_exponent + atomic_resolution + 15),
+      "initialMarginFraction": "0.05",
+      "maintenanceMarginFraction": "0.03",
+    }
+
+  # Latest close of a market
+  def price(self, market):
+    return float(self.candles[market][1][-1])
+
+  # Current block height
+  def block_height(self):
+    return 1000000 + int((time.monotonic() - self.started) / self.block_seconds)
+
+  # Wait simulated latency, failing with a 429 at the configured rate
+  async def request(self, endpoint):
+    stats = self.stats.setdefault(endpoint, {"calls": 0, "rate_limited": 0, "latency": []})
+    stats["calls"] += 1
+    latency = self.latency.get(endpoint, self.latency["default"]) if isinstance(self.latency, dict) else self.latency
+    delay = float(latency * self.rng.lognormal(0, self.latency_sigma))
+    stats["latency"].append(delay)
+    await asyncio.sleep(delay)
+    rate_limit_probability = self.rate_limit_probability
+    if isinstance(rate_limit_probability, dict):
+      rate_limit_probability = rate_limit_probability.get(endpoint, rate_limit_probability.get("default", 0))
+    if self.rng.random() < rate_limit_probability:
+      stats["rate_limited"] += 1
+      raise SimulatedRateLimitError()
+
+  # Bring orders up to date with the clock
+  def update_orders(self):
+    now = time.monotonic()
+    height = self.block_height()
+    for order in self.orders.values():
+      if order["status"] != "OPEN":
+        continue
+      if now >= order["fill_at"] and order["marketable"]:
+        self.fill(order)
+      elif height > order["goodTilBlock"]:
+        order["status"] = "CANCELED"
+
+  # Fill an order (fully or partly), updating positions and cash (collateral less the cost of positions and fees)
+  def fill(self, order):
+    market = order["ticker"]
+    step = self.markets[market]["stepBaseQuantums"] * 10.0 ** self.markets[market]["atomicResolution"]
+    size = round(math.floor(float(order["size"]) * order["fill_fraction"] / step + 1e-9) * step, 12)
+    position = self.positions.get(market, 0.0)
+    change = size if order["side"] == "BUY" else -size
+    if order["reduceOnly"]:
+      change = max(min(change, -position), 0.0) if position < 0 else min(max(change, -position), 0.0)
+    price = self.price(market)
+    self.positions[market] = round(position + change, 12)
+    self.collateral -= change * price + abs(change) * price * 0.0005
+    order["totalFilled"] = str(abs(change))
+    if change != 0:
+
+      # Fills land after any height already reported as processed, as snapshots include every fill so far
+      self.processed_height = max(self.block_height(), self.processed_height + 1)
+      self.fills.append({
+        "id": str(uuid.uuid4()),
+        "side": order["side"],
+        "market": market,
+        "price": str(price),
+        "size": str(abs(change)),
+        "createdAtHeight": str(self.processed_height),
+        "orderId": order["id"],
+      })
+    order["status"] = "FILLED" if order["fill_fraction"] == 1 else "CANCELED"
+    if abs(self.positions[market]) < 1e-12:
+      del self.positions[market]
+
+  # Subaccount in the indexer format
+  def subaccount(self):
+    positions = {}
+    margin = 0.0
+    equity = self.collateral
+    for (market, size) in self.positions.items():
+      price = self.price(market)
+      equity += size * price
+      margin += abs(size) * price * 0.05
+      positions[market] = {
+        "market": market,
+        "status": "OPEN",
+        "side": "LONG" if size > 0 else "SHORT",
+        "size": str(size),
+        "entryPrice": str(price),
+        "sumOpen": str(abs(size)),
+        "unrealizedPnl": "0",
+      }
+    self.processed_height = max(self.block_height(), self.processed_height)
+    return {
+      "address": DYDX_ADDRESS,
+      "subaccountNumber": 0,
+      "equity": str(equity),
+      "freeCollateral": str(equity - margin),
+      "openPerpetualPositions": positions,
+      "latestProcessedBlockHeight": str(self.processed_height),
+    }
+
+  # Accept an order from the node
+  def place(self, order):
+    market = self.clob_pairs[order.order_id.clob_pair_id]
+    info = self.markets[market]
+    size = round(order.quantums * 10.0 ** info["atomicResolution"], 12)
+    price = round(order.subticks / 10.0 ** (info["atomicResolution"] - info["quantumConversionExponent"] + 6), 12)
+    side = "BUY" if order.side == 1 else "SELL"
+    last = self.price(market)
+    marketable = price >= last if side == "BUY" else price <= last
+    partial = self.rng.random() < self.partial_fill_probability
+    order_id = str(uuid.uuid4())
+    now = time.monotonic()
+    self.orders[order_id] = {
+      "id": order_id,
+      "subaccountId": f"{DYDX_ADDRESS}/0",
+      "clientId": str(order.order_id.client_id),
+      "clobPairId": str(order.order_id.clob_pair_id),
+      "ticker": market,
+      "side": side,
+      "size": str(size),
+      "price": str(price),
+      "totalFilled": "0",
+      "status": "OPEN",
+      "type": "LIMIT",
+      "reduceOnly": bool(order.reduce_only),
+      "goodTilBlock": int(order.good_til_block),
+      "createdAtHeight": str(self.block_height()),
+      "visible_at": now + self.indexer_lag,
+      "fill_at": now + self.fill_seconds,
+      "marketable": marketable,
+      "fill_fraction": float(self.rng.uniform(0.1, 0.9)) if partial else 1,
+    }
+    return {"txhash": order_id, "code": 0}
+
+  # Cancel an order from the node
+  def cancel(self, order_id):
+    for order in self.orders.values():
+      if int(order["clientId"]) == order_id.client_id and int(order["clobPairId"]) == order_id.clob_pair_id and order["status"] == "OPEN":
+        order["status"] = "CANCELED"
+    return {"code": 0}
+
+  # Indexer view of an order (hidden until the indexer lag has passed)
+  def public_order(self, order):
+    return {key: value for (key, value) in order.items() if key not in ["visible_at", "fill_at", "marketable", "fill_fraction"]}
+
+  # Latency summary per endpoint
+  def latency_report(self):
+    report = {}
+    for (endpoint, stats) in self.stats.items():
+      latency_ms = np.array(stats["latency"]) * 1000
+      report[endpoint] = {
+        "calls": stats["calls"],
+        "rate_limited": stats["rate_limited"],
+        "p50_ms": percentile(latency_ms, 50),
+        "p95_ms": percentile(latency_ms, 95),
+        "p99_ms": percentile(latency_ms, 99),
+      }
+    return report
+
+
+# Class: Simulated indexer markets endpoints
+class SimulatedMarkets:
+
+  def __init__(self, exchange):
+    self.exchange = exchange
+
+  async def get_perpetual_markets(self, market=None):
+    await self.exchange.request("markets")
+    markets = {ticker: dict(info) for (ticker, info) in self.exchange.markets.items() if market is None or ticker == market}
+    for (ticker, info) in markets.items():
+      info["oraclePrice"] = str(self.exchange.price(ticker))
+    return {"markets": markets}
+
+  async def get_perpetual_market_candles(self, market, resolution, from_iso=None, to_iso=None, limit=None):
+    await self.exchange.request("candles")
+    (started_at, closes) = self.exchange.candles[market]
+    keep = np.ones(len(started_at), dtype=bool)
+    if from_iso is not None:
+      keep &= started_at >= iso_to_epoch(from_iso)
+    if to_iso is not None:
+      keep &= started_at <= iso_to_epoch(to_iso)
+    selected = np.flatnonzero(keep)[::-1][:limit or 100]
+    return {"candles": [
+      {"ticker": market, "resolution": resolution, "startedAt": epoch_to_iso(int(started_at[i])), "close": str(closes[i])}
+      for i in selected
+    ]}
+
+
+# Class: Simulated indexer account endpoints
+class SimulatedAccount:
+
+  def __init__(self, exchange):
+    self.exchange = exchange
+
+  async def get_subaccount(self, address, subaccount_number):
+    await self.exchange.request("subaccount")
+    self.exchange.update_orders()
+    return {"subaccount": self.exchange.subaccount()}
+
+  async def get_subaccount_orders(self, address, subaccount_number, ticker=None, status=None, return_latest_orders=None, **kwargs):
+    await self.exchange.request("orders")
+    self.exchange.update_orders()
+    now = time.monotonic()
+    orders = [
+      self.exchange.public_order(order) for order in self.exchange.orders.values()
+      if now >= order["visible_at"] and (ticker is None or order["ticker"] == ticker) and (status is None or order["status"] == status)
+    ]
+    return sorted(orders, key=lambda x: int(x["createdAtHeight"]), reverse=True)
+
+  async def get_order(self, order_id):
+    await self.exchange.request("orders")
+    self.exchange.update_orders()
+    return self.exchange.public_order(self.exchange.orders[order_id])
+
+  async def get_subaccount_fills(self, address, subaccount_number, ticker=None, limit=None, **kwargs):
+    await self.exchange.request("orders")
+    self.exchange.update_orders()
+    fills = [fill for fill in reversed(self.exchange.fills) if ticker is None or fill["market"] == ticker]
+    return {"fills": fills[:limit or 100]}
+
+
+# Class: Simulated node
+class SimulatedNode:
+
+  def __init__(self, exchange):
+    self.exchange = exchange
+
+  async def latest_block_height(self):
+    await self.exchange.request("block_height")
+    return self.exchange.block_height()
+
+  async def place_order(self, wallet, order):
+    await self.exchange.request("transactions")
+    return self.exchange.place(order)
+
+  async def cancel_order(self, wallet, order_id, good_til_block=None, good_til_block_time=None):
+    await self.exchange.request("transactions")
+    return self.exchange.cancel(order_id)
+
+
+# Connect a Client to a simulated exchange (in-memory candle and position stores)
+# Also serves the candles over a local WebSocket so the market data stream can be exercised
+# Messages go to a recording notifier for the running event loop, so nothing is sent to Telegram
+async def connect_simulated(exchange=None):
+  from func_connections import Client
+  exchange = exchange if exchange is not None else SimulatedExchange()
+  socket = LocalIndexerSocket()
+  for (market, (started_at, closes)) in exchange.candles.items():
+    socket.candles[market] = [(int(candle_started_at), float(close)) for (candle_started_at, close) in zip(started_at[-100:], closes[-100:])]
+  await socket.start()
+  client = Client(exchange.indexer, exchange.indexer, exchange.node, None, CandleStore(":memory:"), PositionStore(":memory:", json_path=None))
+  client.ws_endpoint = socket.url
+  client.exchange = exchange
+  client.local_socket = socket
+  client.notifier = RecordingNotifier()
+  func_messaging.notifier = client.notifier
+  return client
+
+
+# Run exit and entry cycles against the simulated exchange, reporting throughput and tail latency
+async def run_load_test(cycles=20, exchange=None):
+  from func_cointegration import find_cointegrated_pairs
+  from func_exit_pairs import manage_trade_exits
+  from func_entry_pairs import open_positions
+  from func_messaging import close_notifier
+
+  client = await connect_simulated(exchange)
+  exchange = client.exchange
+
+  # Pairs from the simulated history
+  markets = list(exchange.candles.keys())
+  prices = np.column_stack([exchange.candles[market][1] for market in markets])
+  client.pairs = pd.DataFrame(find_cointegrated_pairs(prices, markets, verbose=False), columns=["base_market", "quote_market", "hedge_ratio", "half_life"])
+  print(f"Simulating {len(markets)} markets and {len(client.pairs)} pairs for {cycles} cycles")
+
+  cycle_times = []
+  aborted_cycles = 0
+  start_time = time.perf_counter()
+  try:
+    for cycle in range(cycles):
+
+      # Move the open candle so z-scores change between cycles
+      for market in markets:
+        (started_at, closes) = exchange.candles[market]
+        closes[-1] = max(closes[-1] * (1 + exchange.rng.normal(0, 0.01)), 1.0)
+      client.candle_cache.invalidate()
+
+      # The bot exits on a code red (an unwind that does not fill, which injected partial fills can cause)
+      # Count it and carry on, leaving the aborted cycle out of the cycle times
+      cycle_start = time.perf_counter()
+      try:
+        await manage_trade_exits(client)
+        await open_positions(client)
+      except SystemExit:
+        aborted_cycles += 1
+        print(f"Bot aborted during cycle {cycle + 1}")
+        continue
+      cycle_times.append(time.perf_counter() - cycle_start)
+  finally:
+    total_time = time.perf_counter() - start_time
+    await close_notifier()
+    await client.local_socket.stop()
+
+  return {
+    "cycles": len(cycle_times),
+    "aborted_cycles": aborted_cycles,
+    "cycles_per_minute": len(cycle_times) / total_time * 60,
+    "cycle_p50_seconds": percentile(cycle_times, 50),
+    "cycle_p95_seconds": percentile(cycle_times, 95),
+    "cycle_p99_seconds": percentile(cycle_times, 99),
+    "open_pairs": len(client.position_store.open_ids()),
+    "messages": client.notifier.messages,
+    "endpoints": exchange.latency_report(),
+  }
+
+
+# Load test with the configured simulation settings
+if __name__ == "__main__":
+  from pprint import pprint
+  pprint(asyncio.run(run_load_test()))
@@ -0,0 +1,248 @@
+from constants import RESOLUTION, STREAM_BUFFER_SIZE, STREAM_RECONNECT_MAX_SECONDS, STREAM_STALE_SECONDS
+from func_utils import RESOLUTION_SECONDS, iso_to_epoch, candle_start
+from func_public import fetch_candles
+import pandas as pd
+import numpy as np
+import websockets
+import asyncio
+import json
+import time
+
+
+# Class: Ring buffer of candle closes for one market
+class CandleRingBuffer:
+
+  """
+    Fixed-size buffer of (started_at, close) for the latest candles of a market
+    The last slot is the still-open candle and is overwritten until the next candle starts
+  """
+
+  def __init__(self, size=STREAM_BUFFER_SIZE):
+    self.size = size
+    self.started_at = np.zeros(size, dtype=np.int64)
+    self.closes = np.zeros(size, dtype=np.float64)
+    self.count = 0
+    self.head = 0
+
+  # Slot of the latest candle
+  def last_index(self):
+    return (self.head - 1) % self.size
+
+  # Start time of the latest candle
+  def last_started_at(self):
+    if self.count == 0:
+      return None
+    return int(self.started_at[self.last_index()])
+
+  # Add or update a candle (older candles are ignored)
+  def update(self, started_at, close):
+    last_started_at = self.last_started_at()
+    if last_started_at is not None and started_at == last_started_at:
+      self.closes[self.last_index()] = close
+    elif last_started_at is None or started_at > last_started_at:
+      self.started_at[self.head] = started_at
+      self.closes[self.head] = close
+      self.head = (self.head + 1) % self.size
+      self.count = min(self.count + 1, self.size)
+
+  # Add or update candles given oldest first
+  def merge(self, started_at, closes):
+    for (candle_started_at, close) in zip(started_at, closes):
+      self.update(int(candle_started_at), float(close))
+
+  # Move the close of the open candle with a trade price
+  def update_last_close(self, price, traded_at):
+    last_started_at = self.last_started_at()
+    if last_started_at is not None and traded_at >= last_started_at:
+      self.closes[self.last_index()] = price
+
+  # Get closes oldest first
+  def get_closes(self):
+    if self.count < self.size:
+      return self.closes[:self.count].copy()
+    return np.concatenate([self.closes[self.head:], self.closes[:self.head]])
+
+
+# Class: Streaming market data feed
+class MarketDataStream:
+
+  """
+    Subscribes to the indexer candles and trades channels and keeps a ring buffer of closes per market
+    Reconnects with backoff and backfills any candles missed while disconnected over REST
+    A connection silent for stale_seconds is not served from and is dropped, so a quiet feed never serves stale prices
+  """
+
+  def __init__(self, client, url, size=STREAM_BUFFER_SIZE, stale_seconds=STREAM_STALE_SECONDS):
+    self.client = client
+    self.url = url
+    self.size = size
+    self.stale_seconds = stale_seconds
+    self.buffers = {}
+    self.websocket = None
+    self.connected = False
+    self.task = None
+    self.last_message = 0
+    self.candle_closed = asyncio.Event()
+
+  # Start streaming in the background
+  def start(self, markets):
+    for market in markets:
+      self.buffers.setdefault(market, CandleRingBuffer(self.size))
+    if self.task is None:
+      self.task = asyncio.create_task(self.run())
+
+  # Stop streaming
+  async def stop(self):
+    if self.task is not None:
+      self.task.cancel()
+      try:
+        await self.task
+      except asyncio.CancelledError:
+        pass
+      self.task = None
+    self.connected = False
+
+  # Add markets to the feed (subscribed immediately if connected)
+  async def subscribe(self, markets):
+    for market in markets:
+      if market in self.buffers:
+        continue
+      self.buffers[market] = CandleRingBuffer(self.size)
+      if self.connected:
+        await self.backfill(market)
+        await self.send_subscribe(market)
+
+  # Check if the feed has had a message within stale_seconds
+  def is_fresh(self):
+    return self.connected and time.monotonic() - self.last_message < self.stale_seconds
+
+  # Check if market can be served from the stream
+  def is_ready(self, market):
+    return self.is_fresh() and market in self.buffers and self.buffers[market].count > 0
+
+  # Get closes oldest first
+  def get_closes(self, market):
+    return self.buffers[market].get_closes()
+
+  # Get start time of the latest candle
+  def last_started_at(self, market):
+    return self.buffers[market].last_started_at()
+
+  # Send subscriptions for a market
+  async def send_subscribe(self, market):
+    await self.websocket.send(json.dumps({"type": "subscribe", "channel": "v4_candles", "id": f"{market}/{RESOLUTION}"}))
+    await self.websocket.send(json.dumps({"type": "subscribe", "channel": "v4_trades", "id": market}))
+
+  # Fill candles missed since the latest buffered candle over REST
+  async def backfill(self, market):
+    buffer = self.buffers[market]
+    last_started_at = buffer.last_started_at()
+
+    # Guard: Nothing buffered yet - the subscription snapshot fills the buffer
+    if last_started_at is None:
+      return
+
+    current_start = candle_start(time.time(), RESOLUTION)
+    limit = min((current_start - last_started_at) // RESOLUTION_SECONDS[RESOLUTION] + 1, self.size)
+    response = await fetch_candles(self.client, market, limit = limit)
+    candles = response["candles"][::-1]
+    buffer.merge([iso_to_epoch(candle["startedAt"]) for candle in candles], [float(candle["close"]) for candle in candles])
+
+  # Connect, subscribe and consume messages until disconnected
+  async def connect(self):
+    async with websockets.connect(self.url) as websocket:
+      self.websocket = websocket
+      for market in list(self.buffers.keys()):
+        await self.backfill(market)
+        await self.send_subscribe(market)
+      self.connected = True
+      self.last_message = time.monotonic()
+      while True:
+        try:
+          message = await asyncio.wait_for(websocket.recv(), timeout=self.stale_seconds)
+        except asyncio.TimeoutError:
+          raise ConnectionError(f"no messages for {self.stale_seconds} seconds")
+        self.last_message = time.monotonic()
+        self.handle(json.loads(message))
+
+  # Keep connection alive with reconnect backoff
+  async def run(self):
+    delay = 1
+    while True:
+      try:
+        await self.connect()
+      except asyncio.CancelledError:
+        raise
+      except Exception as e:
+        print(f"Market data stream disconnected - {e}")
+
+      # Reset backoff after a connection that came up
+      if self.connected:
+        delay = 1
+      self.connected = False
+      self.websocket = None
+      await asyncio.sleep(delay)
+      delay = min(delay * 2, STREAM_RECONNECT_MAX_SECONDS)
+
+  # Handle candle update
+  def handle_candle(self, market, candle):
+    market = candle.get("ticker", market)
+    if market not in self.buffers or candle.get("resolution", RESOLUTION) != RESOLUTION:
+      return
+    buffer = self.buffers[market]
+    previous_started_at = buffer.last_started_at()
+    started_at = iso_to_epoch(candle["startedAt"])
+    buffer.update(started_at, float(candle["close"]))
+    if previous_started_at is not None and started_at > previous_started_at:
+      self.candle_closed.set()
+
+  # Handle trades update
+  def handle_trades(self, market, trades):
+    if market not in self.buffers:
+      return
+    for trade in sorted(trades, key=lambda x: x["createdAt"]):
+      self.buffers[market].update_last_close(float(trade["price"]), iso_to_epoch(trade["createdAt"]))
+
+  # Handle message from indexer
+  def handle(self, message):
+    message_type = message.get("type")
+    channel = message.get("channel")
+    if message_type not in ["subscribed", "channel_data", "channel_batch_data"]:
+      if message_type == "error":
+        print(f"Market data stream error - {message.get('message')}")
+      return
+
+    # Batched messages carry a list of contents
+    contents = message.get("contents", {})
+    contents_list = contents if isinstance(contents, list) else [contents]
+    market = message.get("id", "").split("/")[0]
+
+    for contents in contents_list:
+      if channel == "v4_candles":
+        if "candles" in contents:
+          for candle in contents["candles"][::-1]:
+            self.handle_candle(market, candle)
+        else:
+          self.handle_candle(market, contents)
+      elif channel == "v4_trades":
+        self.handle_trades(market, contents.get("trades", []))
+
+
+# Get markets traded by the bot (cointegrated pairs and saved positions)
+def get_tracked_markets(client):
+  markets = set()
+  try:
+    df = pd.read_csv("cointegrated_pairs.csv")
+    markets.update(df["base_market"].tolist())
+    markets.update(df["quote_market"].tolist())
+  except Exception as e:
+    print(f"Unable to read cointegrated pairs - {e}")
+  markets.update(client.position_store.markets())
+  return sorted(markets)
+
+
+# Start market data stream on the client
+def start_market_stream(client, markets, url=None):
+  client.market_stream = MarketDataStream(client, url or client.ws_endpoint)
+  client.market_stream.start(markets)
+  return client.market_stream
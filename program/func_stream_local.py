@@ -0,0 +1,101 @@
+from constants import RESOLUTION
+from func_utils import epoch_to_iso
+import websockets
+import json
+
+
+# Class: Local stand-in for the indexer WebSocket
+class LocalIndexerSocket:
+
+  """
+    Serves the v4_candles and v4_trades channels from in-memory candles for offline runs and tests
+    Candles are held per market as a list of (started_at, close), oldest first
+  """
+
+  def __init__(self, host="127.0.0.1", port=0):
+    self.host = host
+    self.port = port
+    self.server = None
+    self.candles = {}
+    self.connections = set()
+    self.subscriptions = {}
+
+  # WebSocket URL once started
+  @property
+  def url(self):
+    return f"ws://{self.host}:{self.port}"
+
+  # Start serving
+  async def start(self):
+    self.server = await websockets.serve(self.handler, self.host, self.port)
+    self.port = list(self.server.sockets)[0].getsockname()[1]
+    return self
+
+  # Stop serving
+  async def stop(self):
+    self.server.close()
+    await self.server.wait_closed()
+
+  # Drop all client connections (to exercise reconnects)
+  async def drop_connections(self):
+    for websocket in list(self.connections):
+      await websocket.close()
+
+  # Candle message contents
+  def candle_contents(self, market, started_at, close):
+    return {
+      "ticker": market,
+      "resolution": RESOLUTION,
+      "startedAt": epoch_to_iso(started_at),
+      "close": str(close),
+    }
+
+  # Handle a client connection
+  async def handler(self, websocket, *args):
+    self.connections.add(websocket)
+    self.subscriptions[websocket] = set()
+    try:
+      await websocket.send(json.dumps({"type": "connected"}))
+      async for message in websocket:
+        request = json.loads(message)
+        if request.get("type") != "subscribe":
+          continue
+        channel = request["channel"]
+        channel_id = request["id"]
+        self.subscriptions[websocket].add((channel, channel_id))
+        contents = {}
+        if channel == "v4_candles":
+          market = channel_id.split("/")[0]
+          contents = {"candles": [self.candle_contents(market, started_at, close) for (started_at, close) in self.candles.get(market, [])[::-1]]}
+        elif channel == "v4_trades":
+          contents = {"trades": []}
+        await websocket.send(json.dumps({"type": "subscribed", "channel": channel, "id": channel_id, "contents": contents}))
+    except websockets.ConnectionClosed:
+      pass
+    finally:
+      self.connections.discard(websocket)
+      self.subscriptions.pop(websocket, None)
+
+  # Send a message to every subscriber of a channel
+  async def broadcast(self, channel, channel_id, contents):
+    message = json.dumps({"type": "channel_data", "channel": channel, "id": channel_id, "contents": contents})
+    for websocket, subscriptions in list(self.subscriptions.items()):
+      if (channel, channel_id) in subscriptions:
+        try:
+          await websocket.send(message)
+        except websockets.ConnectionClosed:
+          pass
+
+  # Add or update a candle and publish it
+  async def publish_candle(self, market, started_at, close):
+    candles = self.candles.setdefault(market, [])
+    if candles and candles[-1][0] == started_at:
+      candles[-1] = (started_at, close)
+    else:
+      candles.append((started_at, close))
+    await self.broadcast("v4_candles", f"{market}/{RESOLUTION}", self.candle_contents(market, started_at, close))
+
+  # Publish a trade
+  async def publish_trade(self, market, price, traded_at):
+    trade = {"price": str(price), "size": "1", "side": "BUY", "createdAt": epoch_to_iso(traded_at)}
+    await self.broadcast("v4_trades", market, {"trades": [trade]})
@@ -0,0 +1,169 @@
+from constants import WINDOW, ZSCORE_THRESH, MAX_HALF_LIFE, USD_PER_TRADE, HISTORY_CANDLES, SWEEP_WORKERS, SWEEP_OUTPUT_PATH
+from func_backtest import load_price_matrix, select_pairs_by_period, run_backtest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+import itertools
+import numpy as np
+import time
+import csv
+import os
+
+# Price matrix attached from shared memory in pool workers
+_worker_shm = None
+_worker_prices = None
+_worker_markets = None
+
+# Parameters swept by default (each a list of values around the live settings)
+SWEEP_GRID = {
+  "lookback": [HISTORY_CANDLES // 2, HISTORY_CANDLES],
+  "max_half_life": [MAX_HALF_LIFE // 2, MAX_HALF_LIFE],
+  "window": [WINDOW // 2 + 1, WINDOW, WINDOW * 2],
+  "z_thresh": [ZSCORE_THRESH - 0.5, ZSCORE_THRESH, ZSCORE_THRESH + 0.5],
+  "usd_per_trade": [USD_PER_TRADE, USD_PER_TRADE * 2],
+}
+
+# Result columns written per combination
+SWEEP_METRICS = ["pnl", "return", "sharpe", "max_drawdown", "turnover", "fees", "trades", "closed_trades", "win_rate", "seconds"]
+
+
+# Attach pool worker to the shared price matrix (the parent owns and unlinks it)
+def _init_worker(shm_name, shape, markets):
+  global _worker_shm, _worker_prices, _worker_markets
+  _worker_shm = shared_memory.SharedMemory(name=shm_name)
+  _worker_prices = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+  _worker_prices.flags.writeable = False
+  _worker_markets = markets
+
+
+# Select pairs for one (lookback, max_half_life) - the expensive step shared by many combinations
+def _select_pairs_worker(lookback, max_half_life):
+  return select_pairs_by_period(_worker_prices, lookback=lookback, max_half_life=max_half_life)
+
+
+# Backtest one combination using its cached pair selection
+def _backtest_worker(params, periods):
+  start_time = time.perf_counter()
+  stats = run_backtest(
+    _worker_prices,
+    _worker_markets,
+    window=params["window"],
+    z_thresh=params["z_thresh"],
+    max_half_life=params["max_half_life"],
+    usd_per_trade=params["usd_per_trade"],
+    lookback=params["lookback"],
+    periods=periods,
+  )["stats"]
+  stats["seconds"] = time.perf_counter() - start_time
+  return params, stats
+
+
+# Expand a grid of lists into parameter combinations
+def expand_grid(grid):
+  keys = list(grid.keys())
+  return [dict(zip(keys, values)) for values in itertools.product(*[grid[key] for key in keys])]
+
+
+# Class: Streaming results writer
+class ResultWriter:
+
+  """
+    Writes one row per combination as results arrive
+    Parquet (columnar) when pyarrow is installed, otherwise CSV
+  """
+
+  def __init__(self, path, columns, batch_size=64):
+    self.columns = columns
+    self.batch_size = batch_size
+    self.rows = []
+    self.writer = None
+    try:
+      import pyarrow as pa
+      import pyarrow.parquet as pq
+      self.pa = pa
+      self.path = os.path.splitext(path)[0] + ".parquet"
+      self.schema = pa.schema([(column, pa.float64()) for column in columns])
+      self.writer = pq.ParquetWriter(self.path, self.schema)
+      self.file = None
+    except ImportError:
+      self.path = os.path.splitext(path)[0] + ".csv"
+      self.file = open(self.path, "w", newline="")
+      self.csv = csv.DictWriter(self.file, fieldnames=columns)
+      self.csv.writeheader()
+
+  # Add result row
+  def write(self, row):
+    if self.file is not None:
+      self.csv.writerow(row)
+      self.file.flush()
+      return
+    self.rows.append(row)
+    if len(self.rows) >= self.batch_size:
+      self.flush()
+
+  # Write buffered rows as one Parquet row group
+  def flush(self):
+    if self.writer is not None and len(self.rows) > 0:
+      arrays = [self.pa.array([float(row[column]) for row in self.rows], type=self.pa.float64()) for column in self.columns]
+      self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+      self.rows = []
+
+  # Finish file
+  def close(self):
+    if self.writer is not None:
+      self.flush()
+      self.writer.close()
+    if self.file is not None:
+      self.file.close()
+
+
+# Run a parameter sweep over a price matrix (candles x markets)
+def run_sweep(prices, markets, grid=SWEEP_GRID, workers=SWEEP_WORKERS, output_path=SWEEP_OUTPUT_PATH):
+
+  """
+    Combinations run across a process pool which reads one shared copy of the price matrix
+    Pair selection depends only on (lookback, max_half_life), so it runs once per distinct value and is reused
+    Results are written as each combination finishes, returning the output path
+  """
+
+  prices = np.ascontiguousarray(prices, dtype=np.float64)
+  combinations = expand_grid(grid)
+  selection_keys = sorted(set((params["lookback"], params["max_half_life"]) for params in combinations))
+  workers = workers or os.cpu_count() or 1
+  print(f"Sweeping {len(combinations)} combinations ({len(selection_keys)} pair selections) across {workers} processes")
+
+  writer = ResultWriter(output_path, list(grid.keys()) + SWEEP_METRICS)
+  shm = shared_memory.SharedMemory(create=True, size=max(prices.nbytes, 1))
+  try:
+    shared_prices = np.ndarray(prices.shape, dtype=np.float64, buffer=shm.buf)
+    shared_prices[:] = prices
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(shm.name, prices.shape, markets)) as executor:
+
+      # Pair selections (cached for every combination sharing them)
+      futures = {executor.submit(_select_pairs_worker, *key): key for key in selection_keys}
+      pair_cache = {}
+      for future in as_completed(futures):
+        pair_cache[futures[future]] = future.result()
+
+      # Backtests, written as they finish
+      futures = [executor.submit(_backtest_worker, params, pair_cache[(params["lookback"], params["max_half_life"])]) for params in combinations]
+      for (done, future) in enumerate(as_completed(futures), start=1):
+        (params, stats) = future.result()
+        writer.write({**params, **{metric: stats[metric] for metric in SWEEP_METRICS}})
+        if done % 50 == 0 or done == len(futures):
+          print(f"{done} of {len(futures)} combinations done")
+    del shared_prices
+  finally:
+    writer.close()
+    shm.close()
+    shm.unlink()
+
+  print(f"Sweep results saved to {writer.path}")
+  return writer.path
+
+
+# Sweep stored candles over the default grid
+if __name__ == "__main__":
+  index, markets, prices = load_price_matrix()
+  start_time = time.perf_counter()
+  run_sweep(prices, markets)
+  print(f"Sweep finished in {time.perf_counter() - start_time:.1f} seconds")
@@ -1,4 +1,4 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 
 
 # Format number
@@ -21,40 +21,29 @@ def format_number(curr_num, match_num):
     return f"{int(curr_num)}"
 
 
-# Format time
-def format_time(timestamp):
-  return timestamp.replace(microsecond=0).isoformat()
-
-
-# Get ISO Times
-def get_ISO_times():
-
-  # Get timestamps
-  date_start_0 = datetime.now()
-  date_start_1 = date_start_0 - timedelta(hours=100)
-  date_start_2 = date_start_1 - timedelta(hours=100)
-  date_start_3 = date_start_2 - timedelta(hours=100)
-  date_start_4 = date_start_3 - timedelta(hours=100)
-
-  # Format datetimes
-  times_dict = {
-    "range_1": {
-      "from_iso": format_time(date_start_1),
-      "to_iso": format_time(date_start_0),
-    },
-    "range_2": {
-      "from_iso": format_time(date_start_2),
-      "to_iso": format_time(date_start_1),
-    },
-    "range_3": {
-      "from_iso": format_time(date_start_3),
-      "to_iso": format_time(date_start_2),
-    },
-    "range_4": {
-      "from_iso": format_time(date_start_4),
-      "to_iso": format_time(date_start_3),
-    },
-  }
-
-  # Return result
-  return times_dict
+# Candle resolution lengths in seconds
+RESOLUTION_SECONDS = {
+  "1MIN": 60,
+  "5MINS": 300,
+  "15MINS": 900,
+  "30MINS": 1800,
+  "1HOUR": 3600,
+  "4HOURS": 14400,
+  "1DAY": 86400,
+}
+
+
+# Convert DYDX ISO timestamp (eg 2024-07-20T10:00:00.000Z) to epoch seconds
+def iso_to_epoch(iso_string):
+  return int(datetime.fromisoformat(iso_string.replace("Z", "+00:00")).timestamp())
+
+
+# Convert epoch seconds to DYDX ISO timestamp
+def epoch_to_iso(epoch):
+  return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+# Get start of the candle containing the timestamp
+def candle_start(epoch, resolution):
+  seconds = RESOLUTION_SECONDS[resolution]
+  return int(epoch) // seconds * seconds
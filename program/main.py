@@ -1,13 +1,16 @@
 import asyncio
-import time
-from constants import ABORT_ALL_POSITIONS, FIND_COINTEGRATED, PLACE_TRADES, MANAGE_EXITS
+from constants import ABORT_ALL_POSITIONS, FIND_COINTEGRATED, PLACE_TRADES, MANAGE_EXITS, STREAM_MARKET_DATA
+from constants import EXITS_DEADLINE_SECONDS, ENTRIES_DEADLINE_SECONDS, DAEMON_MODE, COINT_REFRESH_SECONDS
 from func_connections import connect_dydx
 from func_private import abort_all_positions, place_market_order, get_open_positions
 from func_public import construct_market_prices
 from func_cointegration import store_cointegration_results
 from func_entry_pairs import open_positions
 from func_exit_pairs import manage_trade_exits
-from func_messaging import send_message
+from func_stream import start_market_stream, get_tracked_markets
+from func_scheduler import Scheduler, cycle_fingerprint
+from func_daemon import get_pairs_age, load_pairs, refresh_pairs_loop, supervise
+from func_messaging import send_message, close_notifier
 
 # MAIN FUNCTION
 async def main():
@@ -21,6 +24,7 @@ async def main():
     print("Program started...")
     print("Connecting to Client...")
     client = await connect_dydx()
+    client.blocks.start()
   except Exception as e:
     print("Error connecting to client: ", e)
     send_message(f"Failed to connect to client {e}")
@@ -38,12 +42,15 @@ async def main():
       exit(1)
 
   # Find Cointegrated Pairs
-  if FIND_COINTEGRATED:
+  # Daemon mode reuses pairs saved within COINT_REFRESH_SECONDS and refreshes them in the background
+  pairs_age = get_pairs_age()
+  pairs_are_recent = pairs_age is not None and pairs_age < COINT_REFRESH_SECONDS
+  if FIND_COINTEGRATED and not (DAEMON_MODE and pairs_are_recent):
 
     # Construct Market Prices
     try:
       print("")
-      print("Fetching token market prices, please allow around 5 minutes...")
+      print("Fetching token market prices...")
       df_market_prices = await construct_market_prices(client)
       print(df_market_prices)
     except Exception as e:
@@ -64,30 +71,72 @@ async def main():
       send_message(f"Error saving cointegrated pairs {e}")
       exit(1)
 
+  # Stream market data for traded markets
+  if STREAM_MARKET_DATA:
+    print("")
+    print("Starting market data stream...")
+    start_market_stream(client, get_tracked_markets(client))
+
+  # Daemon mode - keep pairs in memory and swap in refreshed pairs while trading continues
+  refresh_task = None
+  if DAEMON_MODE:
+    try:
+      await load_pairs(client)
+    except Exception as e:
+      print("Error loading cointegrated pairs: ", e)
+      send_message(f"Error loading cointegrated pairs {e}")
+      exit(1)
+    if FIND_COINTEGRATED:
+      first_delay = COINT_REFRESH_SECONDS - (get_pairs_age() or 0)
+      refresh_task = asyncio.create_task(supervise("pair refresh", refresh_pairs_loop, client, first_delay))
+
   # Run as always on
-  while True:
-
-    # Manage existing positions
-    if MANAGE_EXITS:
-      try:
-        print("")
-        print("Managing exits...")
-        await manage_trade_exits(client)
-        time.sleep(1)
-      except Exception as e:
-        print("Error managing exiting positions: ", e)
-        send_message(f"Error managing exiting positions {e}")
-        exit(1)
+  # Jobs wake on candle closes (or the scheduler timer) and are skipped while their inputs are unchanged
+  scheduler = Scheduler(client)
+  if MANAGE_EXITS:
+    scheduler.add_job("exits", run_exits, EXITS_DEADLINE_SECONDS, cycle_fingerprint)
+  if PLACE_TRADES:
+    scheduler.add_job("entries", run_entries, ENTRIES_DEADLINE_SECONDS, cycle_fingerprint)
+  try:
+    await scheduler.run()
+  finally:
 
-    # Place trades for opening positions
-    if PLACE_TRADES:
-      try:
-        print("")
-        print("Finding trading opportunities...")
-        await open_positions(client)
-      except Exception as e:
-        print("Error trading pairs: ", e)
-        send_message(f"Error opening trades {e}")
-        exit(1)
+    # Stop the pair refresh before the program exits
+    if refresh_task is not None:
+      refresh_task.cancel()
+      await asyncio.gather(refresh_task, return_exceptions=True)
+
+
+# Manage existing positions
+async def run_exits(client):
+  try:
+    print("")
+    print("Managing exits...")
+    await manage_trade_exits(client)
+  except Exception as e:
+    print("Error managing exiting positions: ", e)
+    send_message(f"Error managing exiting positions {e}")
+    exit(1)
+
+
+# Place trades for opening positions
+async def run_entries(client):
+  try:
+    print("")
+    print("Finding trading opportunities...")
+    await open_positions(client)
+  except Exception as e:
+    print("Error trading pairs: ", e)
+    send_message(f"Error opening trades {e}")
+    exit(1)
+
+
+# Run bot, sending any queued messages before the program exits
+async def run():
+  try:
+    await main()
+  finally:
+    await close_notifier()
 
-asyncio.run(main())
\ No newline at end of file
+if __name__ == "__main__":
+  asyncio.run(run())
\ No newline at end of file
@@ -0,0 +1,9 @@
+import sys
+import os
+
+# Modules import each other by name from the program folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# constants reads these at import - placeholders so tests run without a .env
+for key in ["DYDX_ADDRESS", "SECRET_PHRASE", "TELEGRAM_TOKEN", "TELEGRAM_CHAT_ID"]:
+  os.environ.setdefault(key, "test")
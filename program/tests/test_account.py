@@ -0,0 +1,41 @@
+from func_simulator import SimulatedExchange, connect_simulated
+from func_private import place_market_order
+import asyncio
+import pytest
+
+MARKET = "SIM0-USD"
+
+
+# Buy at a failsafe limit far above the market, returning the filled order
+async def buy_failsafe(client, size):
+  price = client.exchange.price(MARKET)
+  (order, order_id) = await place_market_order(client, MARKET, "BUY", size, price * 1.7)
+  assert await client.order_tracker.wait_for_status(order_id, ["FILLED"]) == "FILLED"
+  return await client.order_tracker.get_order(order_id)
+
+
+def test_fill_is_applied_at_the_fill_price_once():
+  async def run():
+    exchange = SimulatedExchange(n_markets=2, n_candles=120, latency=0.001, rate_limit_probability=0, partial_fill_probability=0)
+    client = await connect_simulated(exchange)
+    try:
+      await client.account.refresh()
+      free_collateral = client.account.free_collateral
+      order = await buy_failsafe(client, 1)
+
+      # Margin is taken at the fill price, not the failsafe limit
+      margin = exchange.price(MARKET) * 0.05
+      assert client.account.free_collateral == pytest.approx(free_collateral - margin)
+      assert float(client.account.positions[MARKET]["size"]) == 1
+
+      # The refreshed snapshot includes the fill, so the cached order is not applied again
+      await client.account.refresh()
+      assert order["id"] not in client.account.recorded_orders
+      refreshed = client.account.free_collateral
+      await client.account.record_fill(order)
+      await client.order_tracker.wait_for_status(order["id"], ["FILLED"])
+      assert client.account.free_collateral == refreshed
+      assert float(client.account.positions[MARKET]["size"]) == 1
+    finally:
+      await client.local_socket.stop()
+  asyncio.run(run())
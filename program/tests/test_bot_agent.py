@@ -0,0 +1,54 @@
+from func_bot_agent import BotAgent
+import func_bot_agent
+import asyncio
+import pytest
+
+
+def make_agent():
+  return BotAgent(
+    client=None,
+    market_1="BTC-USD",
+    market_2="ETH-USD",
+    base_side="BUY",
+    base_size=1,
+    base_price=100,
+    quote_side="SELL",
+    quote_size=2,
+    quote_price=50,
+    accept_failsafe_base_price=5,
+    z_score=-2.5,
+    half_life=10,
+    hedge_ratio=2,
+    accept_failsafe_quote_price=85,
+  )
+
+
+def test_unresolved_leg_unwinds_the_other_leg_before_aborting(monkeypatch):
+  messages = []
+  unwound = []
+
+  # Base leg fills, the quote leg is sent but its id never resolves (place_market_order exits)
+  async def place_market_order(client, market, side, size, price, reduce_only=False, on_sent=None):
+    on_sent()
+    if market == "ETH-USD":
+      exit(1)
+    return {}, "order-m1"
+
+  async def check_order_status_by_id(order_id):
+    return "live"
+
+  async def unwind_leg(market, side, size, price):
+    unwound.append((market, side, size, price))
+
+  monkeypatch.setattr(func_bot_agent, "place_market_order", place_market_order)
+  monkeypatch.setattr(func_bot_agent, "send_message", messages.append)
+  monkeypatch.setattr(func_bot_agent, "CONCURRENT_LEGS", True)
+  agent = make_agent()
+  monkeypatch.setattr(agent, "check_order_status_by_id", check_order_status_by_id)
+  monkeypatch.setattr(agent, "unwind_leg", unwind_leg)
+
+  with pytest.raises(SystemExit):
+    asyncio.run(agent.open_trades())
+  assert unwound == [("BTC-USD", "BUY", 1, 5)]
+  assert agent.order_dict["pair_status"] == "ERROR"
+  assert "Error code: 102" in messages[-1]
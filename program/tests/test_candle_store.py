@@ -0,0 +1,47 @@
+from func_simulator import SimulatedExchange, connect_simulated
+from func_public import get_candles_historical
+from constants import RESOLUTION
+import func_public
+import numpy as np
+import asyncio
+
+MARKET = "SIM0-USD"
+
+
+def candle_calls(client):
+  return client.exchange.stats.get("candles", {}).get("calls", 0)
+
+
+def test_store_backfills_a_longer_window_and_prunes_old_candles(monkeypatch):
+  async def run():
+    exchange = SimulatedExchange(n_markets=1, n_candles=400, latency=0.001, rate_limit_probability=0, partial_fill_probability=0)
+    client = await connect_simulated(exchange)
+    (started_at, closes) = exchange.candles[MARKET]
+    try:
+      monkeypatch.setattr(func_public, "CANDLE_STORE_CANDLES", 0)
+      monkeypatch.setattr(func_public, "HISTORY_CANDLES", 50)
+      (stored_started_at, stored_closes) = await get_candles_historical(client, MARKET)
+      np.testing.assert_array_equal(stored_started_at, started_at[-50:])
+
+      # Raising the window fetches the older candles it now needs
+      monkeypatch.setattr(func_public, "HISTORY_CANDLES", 250)
+      (stored_started_at, stored_closes) = await get_candles_historical(client, MARKET)
+      np.testing.assert_array_equal(stored_started_at, started_at[-250:])
+      np.testing.assert_allclose(stored_closes, closes[-250:])
+
+      # Once covered, only the latest candles are requested
+      calls = candle_calls(client)
+      await get_candles_historical(client, MARKET)
+      assert candle_calls(client) == calls + 1
+
+      # Candles beyond the retention are pruned and not fetched again
+      monkeypatch.setattr(func_public, "HISTORY_CANDLES", 50)
+      monkeypatch.setattr(func_public, "CANDLE_STORE_CANDLES", 80)
+      await get_candles_historical(client, MARKET)
+      np.testing.assert_array_equal(client.candle_store.load_arrays(MARKET, RESOLUTION)[0], started_at[-80:])
+      calls = candle_calls(client)
+      await get_candles_historical(client, MARKET)
+      assert candle_calls(client) == calls + 1
+    finally:
+      await client.local_socket.stop()
+  asyncio.run(run())
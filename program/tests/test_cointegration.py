@@ -0,0 +1,39 @@
+from test_engle_granger import make_pairs
+import func_cointegration
+import numpy as np
+import pytest
+
+
+def test_numpy_pair_search_runs_without_a_pool(monkeypatch):
+  def no_pool(*args, **kwargs):
+    raise AssertionError("numpy engine started a process pool")
+  monkeypatch.setattr(func_cointegration, "test_pairs_parallel", no_pool)
+  (series_1, series_2) = make_pairs(15, 400, 0)
+  prices = np.hstack([series_1, series_2])
+  markets = [f"M{i}-USD" for i in range(prices.shape[1])]
+  func_cointegration.find_cointegrated_pairs(prices, markets, workers=4, engine="numpy", verbose=False)
+
+
+def test_rolling_zscore_matches_calculate_zscore():
+  rng = np.random.default_rng(0)
+  spread = np.cumsum(rng.normal(0, 1, 400))
+  resolution_seconds = func_cointegration.RESOLUTION_SECONDS[func_cointegration.RESOLUTION]
+  stream = func_cointegration.RollingZScore()
+  started_at = 0
+  for end in range(30, len(spread)):
+
+    # Open candle moves, then the next candle starts
+    moving = spread[:end].copy()
+    moving[-1] += 0.5
+    stream.update(moving, started_at)
+    started_at += resolution_seconds
+    zscore = stream.update(spread[:end + 1], started_at)
+    assert zscore == pytest.approx(func_cointegration.calculate_zscore(spread[:end + 1]).values[-1], abs=1e-9)
+
+
+def test_rolling_zscore_reseeds_after_a_gap():
+  spread = np.cumsum(np.random.default_rng(1).normal(0, 1, 200))
+  stream = func_cointegration.RollingZScore()
+  stream.update(spread[:100], 0)
+  zscore = stream.update(spread, 10 ** 6)
+  assert zscore == pytest.approx(func_cointegration.calculate_zscore(spread).values[-1], abs=1e-9)
@@ -0,0 +1,62 @@
+from func_engle_granger import engle_granger, engle_granger_batch
+from statsmodels.tsa.stattools import coint
+import numpy as np
+import warnings
+import pytest
+
+
+# Pairs of series, half sharing a random-walk factor (cointegrated) and half independent random walks
+def make_pairs(n_pairs, n_candles, seed):
+  rng = np.random.default_rng(seed)
+  factor = np.cumsum(rng.normal(0, 1, (n_candles, n_pairs)), axis=0) + 100
+  series_1 = np.where(np.arange(n_pairs) % 2 == 0, factor + rng.normal(0, 1, (n_candles, n_pairs)), np.cumsum(rng.normal(0, 1, (n_candles, n_pairs)), axis=0) + 100)
+  series_2 = rng.uniform(0.5, 2, n_pairs) * factor + rng.normal(0, 1, (n_candles, n_pairs))
+  return series_1, series_2
+
+
+def statsmodels_coint(series_1, series_2, lags):
+  with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", category=Warning)
+    return coint(series_1, series_2, trend="c", maxlag=lags, autolag=None)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("lags", [0, 1, 3])
+def test_engle_granger_matches_statsmodels(seed, lags):
+  (series_1, series_2) = make_pairs(20, 400, seed)
+  for pair in range(series_1.shape[1]):
+    (t_stat, p_value, critical_values, _, _) = engle_granger(series_1[:, pair], series_2[:, pair], lags)
+    (expected_t, expected_p, expected_critical) = statsmodels_coint(series_1[:, pair], series_2[:, pair], lags)
+    assert t_stat == pytest.approx(expected_t, abs=1e-8)
+    assert p_value == pytest.approx(expected_p, abs=1e-8)
+    np.testing.assert_allclose(critical_values, expected_critical, rtol=1e-12)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("lags", [0, 1, 3])
+def test_engle_granger_batch_matches_statsmodels(seed, lags):
+  (series_1, series_2) = make_pairs(20, 400, seed)
+  (t_stats, p_values, critical_values, hedge_ratios, intercepts) = engle_granger_batch(series_1, series_2, lags)
+  for pair in range(series_1.shape[1]):
+    (expected_t, expected_p, expected_critical) = statsmodels_coint(series_1[:, pair], series_2[:, pair], lags)
+    assert t_stats[pair] == pytest.approx(expected_t, abs=1e-8)
+    assert p_values[pair] == pytest.approx(expected_p, abs=1e-8)
+    np.testing.assert_allclose(critical_values, expected_critical, rtol=1e-12)
+
+
+def test_engle_granger_batch_matches_single_pair_regression():
+  (series_1, series_2) = make_pairs(10, 400, 3)
+  (_, _, _, hedge_ratios, intercepts) = engle_granger_batch(series_1, series_2)
+  for pair in range(series_1.shape[1]):
+    (_, _, _, hedge_ratio, intercept) = engle_granger(series_1[:, pair], series_2[:, pair])
+    assert hedge_ratios[pair] == pytest.approx(hedge_ratio, rel=1e-9)
+    assert intercepts[pair] == pytest.approx(intercept, rel=1e-9, abs=1e-9)
+
+
+def test_engle_granger_colinear_series():
+  series_2 = np.cumsum(np.random.default_rng(4).normal(0, 1, 400)) + 100
+  series_1 = 2 * series_2 + 1
+  (t_stat, p_value, _, _, _) = engle_granger(series_1, series_2)
+  (expected_t, expected_p, _) = statsmodels_coint(series_1, series_2, 1)
+  assert t_stat == expected_t == -np.inf
+  assert p_value == pytest.approx(expected_p)
@@ -0,0 +1,21 @@
+from func_simulator import SimulatedExchange, run_load_test
+import func_messaging
+import asyncio
+
+
+def test_load_test_records_messages_without_sending(monkeypatch):
+  sent = []
+
+  async def send(self, message):
+    sent.append(message)
+    return "sent"
+
+  monkeypatch.setattr(func_messaging.Notifier, "send", send)
+  monkeypatch.setattr(func_messaging, "send_message_now", sent.append)
+  exchange = SimulatedExchange(n_markets=6, latency=0.001, rate_limit_probability=0, partial_fill_probability=0)
+  result = asyncio.run(run_load_test(3, exchange))
+
+  # Opening a pair sends a message, which the simulator only records
+  opened = [message for message in result["messages"] if "zscore" in message and "half-life" in message]
+  assert len(opened) >= result["open_pairs"] > 0
+  assert sent == []
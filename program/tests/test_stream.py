@@ -0,0 +1,99 @@
+from func_simulator import SimulatedExchange, connect_simulated
+from func_stream import start_market_stream
+from func_public import get_candles_recent
+import numpy as np
+import asyncio
+import time
+
+MARKET = "SIM0-USD"
+
+
+# Simulated exchange serving REST (candles over the indexer) and the local WebSocket from the same candles
+async def make_client():
+  exchange = SimulatedExchange(n_markets=2, n_candles=120, latency=0.001, rate_limit_probability=0, partial_fill_probability=0)
+  return await connect_simulated(exchange)
+
+
+async def wait_until(condition, timeout=5):
+  deadline = time.monotonic() + timeout
+  while not condition():
+    assert time.monotonic() < deadline, "timed out waiting for condition"
+    await asyncio.sleep(0.01)
+
+
+def candle_calls(client):
+  return client.exchange.stats.get("candles", {}).get("calls", 0)
+
+
+def test_stream_serves_candles_when_ready():
+  async def run():
+    client = await make_client()
+    try:
+      stream = start_market_stream(client, [MARKET])
+      await wait_until(lambda: stream.is_ready(MARKET))
+      expected = [close for (_, close) in client.local_socket.candles[MARKET]]
+      np.testing.assert_allclose(stream.get_closes(MARKET), expected)
+
+      # Served from the buffer without a REST request
+      calls = candle_calls(client)
+      np.testing.assert_allclose(await get_candles_recent(client, MARKET), expected)
+      assert candle_calls(client) == calls
+
+      # Live candle updates move the open candle
+      (started_at, close) = client.local_socket.candles[MARKET][-1]
+      await client.local_socket.publish_candle(MARKET, started_at, close + 1)
+      await wait_until(lambda: stream.get_closes(MARKET)[-1] == close + 1)
+    finally:
+      await client.market_stream.stop()
+      await client.local_socket.stop()
+  asyncio.run(run())
+
+
+def test_stream_reconnects_and_backfills_over_rest():
+  async def run():
+    client = await make_client()
+    try:
+      stream = start_market_stream(client, [MARKET])
+      await wait_until(lambda: stream.is_ready(MARKET))
+
+      # While disconnected the latest candles only exist over REST (the socket snapshot ends two candles earlier)
+      del client.local_socket.candles[MARKET][-2:]
+      client.exchange.candles[MARKET][1][-1] = 12345.0
+      calls = candle_calls(client)
+      await client.local_socket.drop_connections()
+      await wait_until(lambda: not stream.connected)
+      assert not stream.is_ready(MARKET)
+
+      await wait_until(lambda: stream.is_ready(MARKET))
+      assert candle_calls(client) > calls
+      assert stream.get_closes(MARKET)[-1] == 12345.0
+      assert stream.last_started_at(MARKET) == int(client.exchange.candles[MARKET][0][-1])
+    finally:
+      await client.market_stream.stop()
+      await client.local_socket.stop()
+  asyncio.run(run())
+
+
+def test_silent_stream_falls_back_to_rest():
+  async def run():
+    client = await make_client()
+    try:
+      stream = start_market_stream(client, [MARKET])
+      stream.stale_seconds = 0.3
+      await wait_until(lambda: stream.is_ready(MARKET))
+
+      # No messages - the buffer stops being served and candles come from REST
+      await asyncio.sleep(0.4)
+      assert not stream.is_ready(MARKET)
+      calls = candle_calls(client)
+      closes = await get_candles_recent(client, MARKET)
+      assert candle_calls(client) > calls
+      assert closes[-1] == client.exchange.candles[MARKET][1][-1]
+
+      # The silent connection is dropped and comes back
+      await wait_until(lambda: not stream.connected)
+      await wait_until(lambda: stream.connected)
+    finally:
+      await client.market_stream.stop()
+      await client.local_socket.stop()
+  asyncio.run(run())